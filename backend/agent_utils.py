@@ -1,10 +1,19 @@
 import os
 import logging
 import json
+import time
+import queue
+import atexit
+import threading
 import google.generativeai as genai
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -33,6 +42,27 @@ if GEMINI_API_KEY:
 else:
     logger.warning("GEMINI_API_KEY not found in environment variables")
 
+def dumps_json(obj, indent: bool = False) -> str:
+    """
+    Serialize obj to a JSON string, using orjson when available.
+    Datetimes and UUIDs are serialized natively; anything else falls back to str().
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=str, option=option).decode()
+    return json.dumps(obj, indent=2 if indent else None, default=str)
+
+def loads_json(text: str):
+    """
+    Parse a JSON string, using orjson when available.
+    orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can catch either.
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
 def get_gemini_response(prompt: str, model_name: str = "gemini-2.0-flash-exp") -> str:
     """
     Get a response from Gemini model.
@@ -45,6 +75,31 @@ def get_gemini_response(prompt: str, model_name: str = "gemini-2.0-flash-exp") -
         logger.error(f"Error calling Gemini API: {e}")
         return f"Error: {str(e)}"
 
+def _collect_streamed_json_text(response) -> str:
+    """
+    Accumulate streamed Gemini chunks, stopping as soon as a complete top-level
+    JSON value has arrived so we never wait on trailing prose or code fences.
+    """
+    decoder = json.JSONDecoder()
+    parts = []
+    for chunk in response:
+        text = chunk.text
+        if not text:
+            continue
+        parts.append(text)
+        if "}" not in text and "]" not in text:
+            continue
+        buffered = "".join(parts)
+        starts = [i for i in (buffered.find("{"), buffered.find("[")) if i >= 0]
+        if not starts:
+            continue
+        try:
+            decoder.raw_decode(buffered, min(starts))
+        except json.JSONDecodeError:
+            continue
+        break
+    return "".join(parts)
+
 def get_gemini_json_response(prompt: str, model_name: str = "gemini-2.0-flash-exp", max_retries: int = 3) -> dict:
     """
     Get a JSON response from Gemini model with retry logic for rate limits and quota errors.
@@ -61,9 +116,10 @@ def get_gemini_json_response(prompt: str, model_name: str = "gemini-2.0-flash-ex
             if "Return a VALID JSON" not in prompt and "return JSON" not in prompt.lower():
                 json_prompt = prompt + "\n\nIMPORTANT: Return ONLY valid JSON, no markdown formatting, no code blocks, no explanations. Just the raw JSON object."
             
-            # Generate content
-            response = model.generate_content(json_prompt)
-            response_text = response.text.strip()
+            # Stream content and stop once the JSON payload is complete
+            response_text = ""
+            response = model.generate_content(json_prompt, stream=True)
+            response_text = _collect_streamed_json_text(response).strip()
             
             # Remove markdown code blocks if present (```json or ```)
             if response_text.startswith("```"):
@@ -77,7 +133,7 @@ def get_gemini_json_response(prompt: str, model_name: str = "gemini-2.0-flash-ex
                 response_text = "\n".join(lines).strip()
             
             # Parse JSON
-            parsed = json.loads(response_text)
+            parsed = loads_json(response_text)
             
             # Handle case where Gemini returns a list instead of dict
             if isinstance(parsed, list):
@@ -119,13 +175,13 @@ def get_gemini_json_response(prompt: str, model_name: str = "gemini-2.0-flash-ex
                 logger.error(f"JSON decode error: {e}")
                 # Try to extract JSON from text if it's wrapped
                 try:
-                    if 'response' in locals():
-                        text = response.text
+                    if response_text:
+                        text = response_text
                         # Try to find JSON object in text
                         start = text.find('{')
                         end = text.rfind('}') + 1
                         if start >= 0 and end > start:
-                            parsed = json.loads(text[start:end])
+                            parsed = loads_json(text[start:end])
                             logger.info("Successfully extracted JSON from wrapped response")
                             return parsed
                 except Exception as extract_error:
@@ -139,9 +195,81 @@ def get_gemini_json_response(prompt: str, model_name: str = "gemini-2.0-flash-ex
     # All retries exhausted
     return {"error": "Max retries exceeded for Gemini API call"}
 
+# Agent action logs are written by a background thread in batches
+LOG_BATCH_SIZE = 50
+LOG_FLUSH_INTERVAL = 0.5  # seconds to wait for a batch to fill
+LOG_QUEUE_MAX = 10_000  # queued rows kept while Supabase is slow or down; the oldest are dropped past this
+LOG_DROP_WARN_EVERY = 1_000  # log a warning every this many dropped rows
+_log_queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+_log_dropped = 0
+_log_dropped_lock = threading.Lock()
+_log_worker = None
+_log_worker_lock = threading.Lock()
+
+def _drain_log_queue(max_items: int, max_wait: float) -> list:
+    """
+    Collect up to max_items rows, waiting at most max_wait seconds after the first one.
+    """
+    try:
+        batch = [_log_queue.get(timeout=max_wait)]
+    except queue.Empty:
+        return []
+
+    deadline = time.monotonic() + max_wait
+    while len(batch) < max_items:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_log_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+def _insert_log_batch(batch: list):
+    try:
+        supabase.table("api_logs").insert(batch).execute()
+    except Exception as e:
+        logger.error(f"Failed to log {len(batch)} agent action(s): {e}")
+
+def _log_worker_loop():
+    while True:
+        batch = _drain_log_queue(LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL)
+        if batch:
+            _insert_log_batch(batch)
+
+def _ensure_log_worker():
+    global _log_worker
+    if _log_worker is not None:
+        return
+    with _log_worker_lock:
+        if _log_worker is None:
+            _log_worker = threading.Thread(target=_log_worker_loop, name="agent-log-writer", daemon=True)
+            _log_worker.start()
+
+def flush_agent_logs():
+    """
+    Synchronously write any queued agent action logs. Registered with atexit.
+    """
+    if not supabase:
+        return
+    while True:
+        batch = []
+        while len(batch) < LOG_BATCH_SIZE:
+            try:
+                batch.append(_log_queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
+        _insert_log_batch(batch)
+
+atexit.register(flush_agent_logs)
+
 def log_agent_action(agent_name: str, action: str, details: dict):
     """
-    Log agent action to Supabase.
+    Queue an agent action log for Supabase. Rows are inserted in batches by a
+    background thread so callers never wait on the database.
     """
     if not supabase:
         logger.warning("Supabase not initialized, skipping log")
@@ -152,8 +280,32 @@ def log_agent_action(agent_name: str, action: str, details: dict):
             "api_name": agent_name,
             "endpoint": action,
             "request_timestamp": "now()",
-            "error_message": json.dumps(details)
+            "error_message": dumps_json(details)
         }
-        supabase.table("api_logs").insert(data).execute()
     except Exception as e:
         logger.error(f"Failed to log agent action: {e}")
+        return
+
+    _ensure_log_worker()
+    _enqueue_log(data)
+
+def _enqueue_log(data: dict):
+    """
+    Queue a log row, dropping the oldest queued row when the queue is full
+    so a slow or unreachable database cannot grow memory without bound.
+    """
+    global _log_dropped
+    while True:
+        try:
+            _log_queue.put_nowait(data)
+            return
+        except queue.Full:
+            try:
+                _log_queue.get_nowait()
+            except queue.Empty:
+                continue
+            with _log_dropped_lock:
+                _log_dropped += 1
+                dropped = _log_dropped
+            if dropped % LOG_DROP_WARN_EVERY == 1:
+                logger.warning(f"Agent log queue full - dropped {dropped} oldest log row(s) so far")
@@ -1,10 +1,16 @@
 import logging
 import json
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime, timezone, timedelta
-from agent_utils import get_gemini_json_response, log_agent_action, supabase
+from agent_utils import get_gemini_json_response, log_agent_action, supabase, dumps_json
 
 logger = logging.getLogger(__name__)
 
+COMPUTE_RESOURCES_TTL = 30  # seconds before cached compute resources are refetched
+
 class ComputeAgent:
     """
     Agent responsible for analyzing compute tasks and finding optimal compute resources.
@@ -13,6 +19,15 @@ class ComputeAgent:
     
     def __init__(self):
         self.agent_name = "compute_agent"
+        # In-flight find_optimal_resources calls keyed by requirements hash
+        self._inflight: dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        # TTL cache of the asset/window/snapshot rows, prefilled in the background
+        self._resources_cache = None
+        self._resources_cached_at = 0.0
+        self._resources_generation = 0  # bumped by invalidate_compute_resources
+        self._resources_lock = threading.Lock()
+        self._refresh_resources_async()
 
     def analyze_task(self, user_request: str) -> dict:
         """
@@ -61,14 +76,53 @@ class ComputeAgent:
 
     def _get_compute_resources(self) -> dict:
         """
-        Query Supabase for available compute resources across all relevant tables.
+        Return available compute resources. Assets, windows and grid snapshots
+        are served from a short-lived cache when fresh; workloads and schedules
+        change with every scheduling write, so they are always read live for
+        the conflict check.
+        """
+        with self._resources_lock:
+            cached = self._resources_cache
+            if cached is not None and time.monotonic() - self._resources_cached_at >= COMPUTE_RESOURCES_TTL:
+                cached = None
+        if cached is None:
+            cached = self._refresh_compute_resources()
+        return {**cached, **self._fetch_workload_state()}
+
+    def _refresh_compute_resources(self) -> dict:
+        with self._resources_lock:
+            generation = self._resources_generation
+        data = self._fetch_compute_resources()
+        with self._resources_lock:
+            # An invalidation during the fetch means these rows may predate the write
+            if generation == self._resources_generation:
+                self._resources_cache = data
+                self._resources_cached_at = time.monotonic()
+        return data
+
+    def _refresh_resources_async(self):
+        if supabase:
+            threading.Thread(target=self._refresh_compute_resources, name="compute-resources-warm", daemon=True).start()
+
+    def invalidate_compute_resources(self):
+        """
+        Drop cached compute resources after a write to the asset, window or
+        snapshot tables and refetch in the background so the next request
+        stays warm.
+        """
+        with self._resources_lock:
+            self._resources_cache = None
+            self._resources_generation += 1
+        self._refresh_resources_async()
+
+    def _fetch_compute_resources(self) -> dict:
+        """
+        Query Supabase for the slow-changing compute resources (assets, windows, grid snapshots).
         """
         now = datetime.now(timezone.utc)
         data = {
             "compute_assets": [],
             "compute_windows": [],
-            "compute_workloads": [],
-            "workload_schedules": [],
             "grid_snapshots": [],
             "timestamp": now.isoformat()
         }
@@ -91,21 +145,6 @@ class ComputeAgent:
             except Exception as e:
                 logger.warning(f"Could not fetch compute windows: {e}")
             
-            # Get existing workloads (to check conflicts)
-            # Specify which relationship to use (asset_id, not recommended_asset_id)
-            try:
-                workloads = supabase.table("compute_workloads").select("*, compute_assets!compute_workloads_asset_id_fkey(*)").in_("status", ["pending", "scheduled", "running"]).execute()
-                data["compute_workloads"] = workloads.data or []
-            except Exception as e:
-                logger.warning(f"Could not fetch compute workloads: {e}")
-            
-            # Get workload schedules (recent scheduling decisions)
-            try:
-                schedules = supabase.table("workload_schedules").select("*, compute_workloads(*)").order("decision_timestamp", desc=True).limit(50).execute()
-                data["workload_schedules"] = schedules.data or []
-            except Exception as e:
-                logger.warning(f"Could not fetch workload schedules: {e}")
-            
             # Get grid snapshots (available windows with conditions)
             try:
                 snapshots = supabase.table("grid_snapshots").select("*, compute_windows(*, grid_zones(*))").order("snapshot_timestamp", desc=True).limit(50).execute()
@@ -118,10 +157,63 @@ class ComputeAgent:
         
         return data
 
+    def _fetch_workload_state(self) -> dict:
+        """
+        Query Supabase for the workloads and schedules the conflict check needs (never cached).
+        """
+        data = {
+            "compute_workloads": [],
+            "workload_schedules": []
+        }
+        
+        if not supabase:
+            return data
+        
+        # Get existing workloads (to check conflicts)
+        # Specify which relationship to use (asset_id, not recommended_asset_id)
+        try:
+            workloads = supabase.table("compute_workloads").select("*, compute_assets!compute_workloads_asset_id_fkey(*)").in_("status", ["pending", "scheduled", "running"]).execute()
+            data["compute_workloads"] = workloads.data or []
+        except Exception as e:
+            logger.warning(f"Could not fetch compute workloads: {e}")
+        
+        # Get workload schedules (recent scheduling decisions)
+        try:
+            schedules = supabase.table("workload_schedules").select("*, compute_workloads(*)").order("decision_timestamp", desc=True).limit(50).execute()
+            data["workload_schedules"] = schedules.data or []
+        except Exception as e:
+            logger.warning(f"Could not fetch workload schedules: {e}")
+        
+        return data
+
     def find_optimal_resources(self, compute_requirements: dict) -> dict:
         """
         Find the top 3 optimal compute resource options based on available assets, windows, and schedules.
+        Concurrent calls with identical requirements share a single Gemini round-trip.
         """
+        key = hashlib.sha256(json.dumps(compute_requirements, sort_keys=True, default=str).encode()).hexdigest()
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            logger.info("Joining in-flight compute resource search for identical requirements")
+            return future.result()
+
+        try:
+            future.set_result(self._find_optimal_resources(compute_requirements))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        return future.result()
+
+    def _find_optimal_resources(self, compute_requirements: dict) -> dict:
         logger.info("Finding optimal compute resources...")
         
         # Fetch compute resources from Supabase
@@ -140,7 +232,7 @@ class ComputeAgent:
         You are an expert AI Compute Agent. Your goal is to analyze available compute resources and identify the TOP 3 optimal compute options (assets + windows) for a workload, ranked by compute resource optimization.
 
         Compute Requirements:
-        {json.dumps(compute_requirements, indent=2)}
+        {dumps_json(compute_requirements, indent=True)}
 
         Available Compute Resources:
         - Compute Assets: {len(compute_data.get('compute_assets', []))} active assets
@@ -150,7 +242,7 @@ class ComputeAgent:
         - Grid Snapshots: {len(compute_data.get('grid_snapshots', []))} available windows with conditions
 
         Detailed Data:
-        {json.dumps(data_summary, indent=2, default=str)}
+        {dumps_json(data_summary, indent=True)}
 
         Please analyze ALL available data and provide a VALID JSON response with the TOP 3 options:
         {{
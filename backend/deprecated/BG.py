@@ -21,15 +21,35 @@ import logging
 import uuid
 import time
 import re
-from datetime import datetime, timezone
+import asyncio
+import copy
+import random
+import warnings
+import hashlib
+import functools
+import importlib.util
+from collections import deque, OrderedDict
+from datetime import date, datetime, timezone
+from decimal import Decimal
 from pathlib import Path
-from queue import Queue, Empty
+from queue import Queue, Empty, Full
 from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
+import orjson
 from dotenv import load_dotenv
 from flask import Flask, jsonify, Response, request
-from supabase import create_client, Client
+from flask.json.provider import DefaultJSONProvider
+from supabase import create_client, Client, ClientOptions
+import httpx
 from google import genai
+from google.genai import types as genai_types
+
+try:
+    import psycopg  # optional: LISTEN/NOTIFY wakeups instead of idle polling
+except ImportError:
+    psycopg = None
 
 # Load environment variables
 env_path = Path(__file__).parent / ".env"
@@ -45,14 +65,50 @@ logger = logging.getLogger(__name__)
 # Configuration
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+SUPABASE_DB_URL = os.environ.get("SUPABASE_DB_URL")  # optional direct Postgres DSN for LISTEN/NOTIFY
+WORKLOAD_NOTIFY_CHANNEL = "workload_ready"
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+LLM_ENABLED = bool(GEMINI_API_KEY)  # the key is read once at startup
 BG_PORT = 5050
 BG_HOST = "0.0.0.0"
 BG_ID = "https://localhost:5050/beckn"
 DOMAIN = "deg:compute"
 POLL_INTERVAL = 2  # seconds between polling the notification queue
-LLM_RATE_LIMIT = 0.1  # seconds between LLM calls
+POLL_INTERVAL_MIN = 0.2  # poll interval right after a workload was processed
+POLL_INTERVAL_MAX = 10.0  # poll interval ceiling when the queue stays idle
+POLL_BACKOFF = 1.5  # growth factor per idle poll cycle
+NOTIFICATION_BATCH_SIZE = 8  # notifications claimed per queue query
+UNPROCESSED_COUNT_TTL = 60.0  # seconds before /beckn/status re-counts unprocessed notifications in the DB
+LLM_MAX_CONCURRENCY = 4  # concurrent in-flight Gemini requests
+LLM_MAX_QPS = 10.0  # sustained Gemini request rate (token bucket refill)
+LLM_BURST = 4  # requests allowed back-to-back before the bucket throttles
+LLM_RETRY_BASE_DELAY = 1.0  # seconds, scaled up under rate limiting
+LLM_RETRY_MAX_DELAY = 30.0  # cap for non-rate-limit backoff
+LLM_STREAM_MAX_CHARS = 64_000  # abort a streamed response that runs past this size
 LLM_MAX_RETRIES = 3
+LLM_CACHE_MAX_ENTRIES = 512
+LLM_CACHE_TTL = 300  # seconds a cached LLM answer stays valid for similar contexts
+PROMPT_CACHE_MAX_ENTRIES = 64
+LLM_BATCH_MAX = 8  # tasks combined into one Gemini call
+GEMINI_HTTP_TIMEOUT_MS = 30_000
+GEMINI_MAX_CONNECTIONS = 32
+GEMINI_MAX_KEEPALIVE = 16
+SUPABASE_MAX_KEEPALIVE = 8
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+# google-genai uses aiohttp for async calls when it is installed, httpx otherwise
+GENAI_ASYNC_USES_HTTPX = importlib.util.find_spec("aiohttp") is None
+
+# Seconds each decision context input stays cached between workloads
+CONTEXT_CACHE_TTL = {"grid_signals": 30, "regional_signals": 30, "data_centres": 60, "generation_mix": 60}
+
+# LOW-urgency workloads deferrable for longer than this (minutes) skip the input
+# fetches and reuse the last context snapshot, if it is younger than the max age
+DEFERRAL_CACHE_THRESHOLD = 240
+DEFERRAL_SNAPSHOT_MAX_AGE = 900  # seconds
+
+# Weights for the precomputed DC suitability score (sum to 1)
+SUITABILITY_WEIGHTS = {"carbon": 0.5, "price": 0.25, "stress": 0.15, "load": 0.1}
+SUITABILITY_CARBON_SCALE = 500.0  # gCO2/kWh treated as worst case when the task has no carbon cap
 
 # BG Agent Configuration
 BG_AGENT_ID = "beckn-gateway-001"
@@ -63,27 +119,160 @@ BG_AGENT_TYPE = "COMPUTE_ORCHESTRATOR"
 # Valid models: gemini-2.0-flash, gemini-2.0-flash-exp, gemini-1.5-flash, gemini-1.5-pro
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
 
+
+def gemini_http_options() -> genai_types.HttpOptions:
+    """
+    Pooled keep-alive transport for the Gemini client so repeated calls from
+    the poll loop reuse one TLS session (HTTP/2 when the h2 package is installed).
+    The httpx-only arguments are passed to the async client only when the SDK's
+    async transport is httpx; aiohttp would reject them.
+    """
+    transport_args = {
+        "http2": HTTP2_AVAILABLE,
+        "limits": httpx.Limits(
+            max_keepalive_connections=GEMINI_MAX_KEEPALIVE,
+            max_connections=GEMINI_MAX_CONNECTIONS
+        )
+    }
+    return genai_types.HttpOptions(
+        timeout=GEMINI_HTTP_TIMEOUT_MS,
+        client_args=transport_args,
+        async_client_args=transport_args if GENAI_ASYNC_USES_HTTPX else None
+    )
+
+
 # Initialize Gemini client (uses GEMINI_API_KEY env var automatically)
 gemini_client = None
 if GEMINI_API_KEY:
     try:
-        gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+        gemini_client = genai.Client(api_key=GEMINI_API_KEY, http_options=gemini_http_options())
         logger.info(f"Gemini client initialized with model: {GEMINI_MODEL}")
     except Exception as e:
         logger.error(f"Failed to initialize Gemini client: {e}")
 
+# Dedicated event loop for async Gemini calls, shared by the poll thread and Flask workers
+llm_loop = asyncio.new_event_loop()
+Thread(target=llm_loop.run_forever, name="gemini-llm-loop", daemon=True).start()
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+# Token bucket enforcing LLM_MAX_QPS without a fixed per-call sleep
+llm_token_bucket = {"tokens": float(LLM_BURST), "updated": time.monotonic()}
+llm_token_lock = asyncio.Lock()
+
+# Recent Gemini outcomes (True = rate limited) and smoothed latency, used to size retry delays
+gemini_stats = {
+    "outcomes": deque(maxlen=100),
+    "ewma_latency": 0.0
+}
+
+RETRY_DELAY_RE = re.compile(r"retry[_ ]?delay['\"]?\s*(?:[:=]|\{)\s*(?:seconds:\s*)?['\"]?(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+def run_on_llm_loop(coro):
+    """Run a coroutine on the LLM event loop and block until it completes"""
+    return asyncio.run_coroutine_threadsafe(coro, llm_loop).result()
+
+
+async def acquire_llm_token():
+    """Wait for a token from the Gemini request bucket"""
+    async with llm_token_lock:
+        now = time.monotonic()
+        llm_token_bucket["tokens"] = min(
+            LLM_BURST,
+            llm_token_bucket["tokens"] + (now - llm_token_bucket["updated"]) * LLM_MAX_QPS
+        )
+        llm_token_bucket["updated"] = now
+
+        if llm_token_bucket["tokens"] < 1:
+            await asyncio.sleep((1 - llm_token_bucket["tokens"]) / LLM_MAX_QPS)
+            llm_token_bucket["tokens"] = 1.0
+            llm_token_bucket["updated"] = time.monotonic()
+
+        llm_token_bucket["tokens"] -= 1
+
+
+def record_gemini_outcome(rate_limited: bool, latency: float = None):
+    """Track recent rate limiting and response latency"""
+    gemini_stats["outcomes"].append(rate_limited)
+    if latency is not None:
+        previous = gemini_stats["ewma_latency"]
+        gemini_stats["ewma_latency"] = latency if previous == 0.0 else 0.8 * previous + 0.2 * latency
+
+
+def gemini_error_rate() -> float:
+    """Fraction of recent Gemini calls that were rate limited"""
+    outcomes = gemini_stats["outcomes"]
+    return sum(outcomes) / len(outcomes) if outcomes else 0.0
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether a Gemini exception is a 429 / RESOURCE_EXHAUSTED"""
+    if getattr(error, "code", None) == 429:
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+def retry_delay_for(error: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before retrying a failed attempt (error is None for an
+    empty or unparseable response). Rate limits prefer the server's retry
+    hint, otherwise scale backoff with the recent rate-limit rate; other
+    failures use jittered exponential backoff.
+    """
+    if error is None or not is_rate_limit_error(error):
+        return min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt + random.random())
+
+    hint = getattr(error, "retry_delay", None)
+    if hint is None:
+        match = RETRY_DELAY_RE.search(str(error))
+        if match:
+            hint = float(match.group(1))
+    if hint is not None:
+        return hint.total_seconds() if hasattr(hint, "total_seconds") else float(hint)
+
+    return LLM_RETRY_BASE_DELAY * (1 + gemini_error_rate()) * 2 ** attempt
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes/decodes with orjson instead of json"""
+
+    # Single-line bodies with keys in insertion order, also under debug=True
+    compact = True
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps_json(obj, indent=not self.compact, sort_keys=self.sort_keys)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 # Flask app
 app = Flask(__name__)
-
-# In-memory store for broadcast items
-broadcast_queue = Queue()
-catalog_items = []
+app.json = OrjsonProvider(app)
+
+# In-memory store for broadcast items (oldest catalog items / unpolled broadcasts evicted past the cap)
+CATALOG_MAX_ITEMS = 10_000
+BROADCAST_POLL_BACKLOG = 1_000
+SSE_CLIENT_BACKLOG = 256  # frames buffered per SSE client; a stalled client loses the oldest
+broadcast_queue = Queue(maxsize=BROADCAST_POLL_BACKLOG)  # (message_id, encoded JSON bytes) for /beckn/broadcast/poll
+
+# One queue per connected SSE client, so every client receives every broadcast.
+# The tuple is rebound (never mutated) under the lock; publishers read it lock-free.
+sse_subscribers = ()
+sse_subscribers_lock = Lock()
+catalog_items = deque(maxlen=CATALOG_MAX_ITEMS)
+catalog_version = 0  # bumped on every catalog change
+catalog_body = (-1, b"")  # (catalog_version, encoded catalog message) served by /beckn/catalog
 
 # =============================================================================
 # DECISION CONTEXT - The main data package for task processing
 # =============================================================================
 
-# Current decision context (the active task being processed)
+# Current decision context (the active task being processed). Like
+# llm_output_state below, readers only need a reference snapshot, so
+# they skip the lock; it serializes the claim/swap/mark-processed writers.
 current_decision_context = None
 decision_context_lock = Lock()
 
@@ -91,11 +280,17 @@ decision_context_lock = Lock()
 pending_tasks_queue = Queue()
 
 # LLM output storage - BPP monitors this endpoint
-llm_output_store = {
-    "latest": None,
-    "history": [],
-    "lock": Lock()
-}
+LLM_HISTORY_SIZE = 100  # most recent LLM outputs kept for /beckn/llm-output/history
+LLM_PENDING_MAX = 100  # unacknowledged outputs kept for BPP; the oldest is dropped past this
+
+# (pending, history) as one immutable pair, rebound wholesale on every write:
+# readers unpack it without locking and never see pending and history disagree.
+# pending holds the outputs BPP has not acknowledged, oldest first; a batch
+# stores several outputs within milliseconds, so /beckn/llm-output serves them
+# one at a time and only advances on acknowledge. The lock only serializes
+# writers building the next pair.
+llm_output_state = ((), ())
+llm_output_lock = Lock()
 
 # Agent state tracking
 bg_agent_state = {
@@ -106,20 +301,93 @@ bg_agent_state = {
 }
 
 
+def put_dropping_oldest(q: Queue, frame: tuple):
+    """Put frame on a bounded queue, dropping the oldest entry when it is full"""
+    while True:
+        try:
+            q.put_nowait(frame)
+            return
+        except Full:
+            try:
+                q.get_nowait()
+            except Empty:
+                pass
+
+
+def publish_broadcast(msg: dict):
+    """Encode a broadcast once and fan it out to every SSE client and the poll queue"""
+    frame = (msg["context"]["message_id"], dumps_json_bytes(msg))
+    # Broadcasts a client or poller never reads must not pile up
+    for subscriber in sse_subscribers:
+        put_dropping_oldest(subscriber, frame)
+    put_dropping_oldest(broadcast_queue, frame)
+
+
+def subscribe_sse() -> Queue:
+    """Register a new SSE client queue"""
+    global sse_subscribers
+    subscriber = Queue(maxsize=SSE_CLIENT_BACKLOG)
+    with sse_subscribers_lock:
+        sse_subscribers = sse_subscribers + (subscriber,)
+    return subscriber
+
+
+def unsubscribe_sse(subscriber: Queue):
+    """Drop an SSE client queue once its stream ends"""
+    global sse_subscribers
+    with sse_subscribers_lock:
+        sse_subscribers = tuple(q for q in sse_subscribers if q is not subscriber)
+
+
+def drain_queue(q: Queue) -> list:
+    """Take every item currently in q under a single acquisition of its mutex"""
+    with q.mutex:
+        items = list(q.queue)
+        q.queue.clear()
+        q.not_full.notify_all()
+    return items
+
+
+# (unix second, "YYYY-MM-DDTHH:MM:SS") of the last _iso_now() call
+_iso_second = (0, "")
+
+
+def _iso_now() -> str:
+    """Current UTC time in isoformat(), formatting the date part once per second"""
+    global _iso_second
+    t = time.time()
+    second, prefix = _iso_second
+    if int(t) != second:
+        second = int(t)
+        prefix = datetime.fromtimestamp(second, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        _iso_second = (second, prefix)
+    return f"{prefix}.{int((t - second) * 1e6):06d}+00:00"
+
+
+# Beckn context header fields that never change; the None slots are filled per message
+BECKN_CONTEXT_TEMPLATE = {
+    "domain": DOMAIN,
+    "country": "GBR",
+    "city": "std:london",
+    "action": None,
+    "core_version": "1.1.0",
+    "bg_id": BG_ID,
+    "bg_uri": BG_ID,
+    "transaction_id": None,
+    "message_id": None,
+    "timestamp": None,
+    "ttl": "PT30M"
+}
+
+
 def create_beckn_context(action: str, transaction_id: str = None, message_id: str = None) -> dict:
     """Create a Beckn-compliant context header"""
     return {
-        "domain": DOMAIN,
-        "country": "GBR",
-        "city": "std:london",
+        **BECKN_CONTEXT_TEMPLATE,
         "action": action,
-        "core_version": "1.1.0",
-        "bg_id": BG_ID,
-        "bg_uri": BG_ID,
         "transaction_id": transaction_id or str(uuid.uuid4()),
         "message_id": message_id or str(uuid.uuid4()),
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "ttl": "PT30M"
+        "timestamp": _iso_now()
     }
 
 
@@ -164,6 +432,13 @@ def workload_to_beckn_item(workload: dict) -> dict:
     }
 
 
+def add_catalog_item(item: dict):
+    """Append a Beckn item to the catalog and invalidate the cached catalog body"""
+    global catalog_version
+    catalog_items.append(item)
+    catalog_version += 1
+
+
 def create_broadcast_message(workload: dict) -> dict:
     """Create a full Beckn broadcast message for a new workload."""
     return {
@@ -192,58 +467,234 @@ def create_broadcast_message(workload: dict) -> dict:
     }
 
 
+# =============================================================================
+# SUITABILITY PRE-SCORING
+# =============================================================================
+
+def _as_float_array(values) -> np.ndarray:
+    """Convert a list of optional numbers to a float array (None -> NaN)"""
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+def precompute_suitability(data_centres: list, task: dict, regional_signals: list, grid_latest: dict) -> tuple:
+    """
+    Score every data centre 0-100 against the task constraints in one
+    vectorised pass. Lower carbon, cost, grid stress and load score higher.
+    Returns (scores, violations) where violations flags DCs that break the
+    task's carbon cap or price ceiling.
+    """
+    grid_latest = grid_latest or {}
+    regional_carbon = {}
+    for signal in regional_signals:
+        name = (signal.get("regions") or {}).get("short_name")
+        if name and name not in regional_carbon:
+            regional_carbon[name] = signal.get("carbon_intensity_forecast")
+
+    national_carbon = grid_latest.get("carbon_intensity_forecast")
+    carbon = _as_float_array([
+        regional_carbon.get(dc.get("location_region"), dc.get("current_carbon_intensity"))
+        for dc in data_centres
+    ])
+    carbon = np.where(np.isnan(carbon), np.nan if national_carbon is None else national_carbon, carbon)
+    pue = np.nan_to_num(_as_float_array([dc.get("pue") for dc in data_centres]), nan=1.5)
+    load = np.nan_to_num(_as_float_array([dc.get("current_load_percentage") for dc in data_centres]), nan=50.0) / 100.0
+
+    cap = task.get("carbon_cap_gco2")
+    carbon_ratio = carbon / (cap if cap else SUITABILITY_CARBON_SCALE)
+
+    price = grid_latest.get("wholesale_price_gbp_mwh")
+    energy_kwh = task.get("estimated_energy_kwh")
+    max_price = task.get("max_price_gbp")
+    if price is not None and energy_kwh and max_price:
+        price_ratio = (price * energy_kwh / 1000.0) * pue / max_price
+    else:
+        price_ratio = np.zeros(len(data_centres))
+
+    stress = grid_latest.get("grid_stress_score") or 0.0
+
+    w = SUITABILITY_WEIGHTS
+    scores = 100.0 * (
+        1.0
+        - w["carbon"] * np.clip(np.nan_to_num(carbon_ratio, nan=0.5), 0.0, 1.0)
+        - w["price"] * np.clip(price_ratio, 0.0, 1.0)
+        - w["stress"] * min(max(stress, 0.0), 1.0)
+        - w["load"] * np.clip(load, 0.0, 1.0)
+    )
+    if cap:
+        violations = np.nan_to_num(carbon_ratio) > 1.0
+    else:
+        violations = np.zeros(len(data_centres), dtype=bool)
+    violations |= price_ratio > 1.0
+    return np.round(scores, 1), violations
+
+
+def annotate_suitability(decision_context: dict):
+    """
+    Attach _precomputed_suitability and _violates_constraints to each DC of a
+    normalized decision context, so the LLM copies a number instead of doing
+    arithmetic. Runs lazily, only when a prompt is actually needed (cache hits
+    skip it), and at most once per context.
+    """
+    data_centres = decision_context.get("data_centres") or []
+    if not data_centres or "_precomputed_suitability" in data_centres[0]:
+        return
+
+    scores, violations = precompute_suitability(
+        data_centres,
+        decision_context.get("task") or {},
+        decision_context.get("regional_signals") or [],
+        (decision_context.get("grid_signals") or {}).get("latest")
+    )
+    for dc, score, violated in zip(data_centres, scores, violations):
+        dc["_precomputed_suitability"] = float(score)
+        dc["_violates_constraints"] = bool(violated)
+
+
 # =============================================================================
 # GEMINI LLM INTEGRATION
 # =============================================================================
 
-def build_llm_prompt(decision_context: dict) -> str:
-    """Build the prompt for Gemini LLM"""
-    num_dcs = len(decision_context.get("data_centres", []))
+def _normalize_for_json(obj):
+    """
+    Return a copy of obj whose leaves are all JSON-native: datetimes become
+    ISO strings, UUIDs strings, Decimals and NumPy scalars plain numbers.
+    Done once per decision context so serializers need no default callback.
+    """
+    root = [obj]
+    stack = [(root, 0)]
+    while stack:
+        container, key = stack.pop()
+        value = container[key]
+        if isinstance(value, dict):
+            value = container[key] = dict(value)
+            stack.extend((value, k) for k in value)
+        elif isinstance(value, (list, tuple)):
+            value = container[key] = list(value)
+            stack.extend((value, i) for i in range(len(value)))
+        elif isinstance(value, (datetime, date)):
+            container[key] = value.isoformat()
+        elif isinstance(value, uuid.UUID):
+            container[key] = str(value)
+        elif isinstance(value, Decimal):
+            container[key] = float(value)
+        elif isinstance(value, np.generic):
+            container[key] = value.item()
+    return root[0]
+
+
+def _dumps_bytes(obj) -> bytes:
+    """Pretty-print an already normalized obj as UTF-8 JSON for the prompt"""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+
+def _dumps(obj) -> str:
+    """Pretty-print an already normalized obj as JSON for the prompt"""
+    return _dumps_bytes(obj).decode()
+
+
+def dumps_json_bytes(obj) -> bytes:
+    """Compact dumps_json output as UTF-8 bytes, for pre-encoded bodies and SSE frames"""
+    return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def dumps_json(obj, indent: bool = False, sort_keys: bool = False) -> str:
+    """Serialize arbitrary data (datetimes, UUIDs, NumPy values, non-str keys) for logs, broadcasts and responses"""
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(obj, default=str, option=option).decode()
+
+
+# Column order for the data centre table in the prompt (dotted keys are nested fields)
+DC_FLAT_KEYS = (
+    "id", "dc_id", "name", "location_region", "region_info.short_name", "region_info.country",
+    "pue", "total_capacity_teraflops", "flexibility_rating", "current_carbon_intensity",
+    "current_load_percentage", "status", "_precomputed_suitability", "_violates_constraints"
+)
 
-    prompt = f"""You are an energy-aware compute scheduling assistant. Using ONLY the data provided below, generate exactly {num_dcs + 1} JSON objects.
 
-## Required Output Format
+def soa_keys(records: list) -> list:
+    """Flattened (dotted) keys across records, in first-seen order"""
+    keys = {}
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, dict):
+                keys.update((f"{key}.{sub}", None) for sub in value)
+            else:
+                keys[key] = None
+    return list(keys)
 
-You must output a single JSON object with this exact structure:
-{{
-    "data_centre_options": [
-        // {num_dcs} JSON objects, one per data centre
-    ],
-    "task": {{
-        // 1 JSON object for the original task
-    }}
-}}
 
-## Data Centre JSON Schema (repeat for each of the {num_dcs} data centres):
-{{
+def to_soa(records: list, keys) -> dict:
+    """
+    Convert a list of records to a column table: the keys are declared once
+    and each row holds the values positionally, so field names are not
+    repeated per record in the prompt.
+    """
+    paths = [(key, *key.split(".", 1)) for key in keys]
+    rows = []
+    for record in records:
+        row = []
+        for key, head, *tail in paths:
+            if tail:
+                nested = record.get(head)
+                row.append(nested.get(tail[0]) if isinstance(nested, dict) else None)
+            else:
+                row.append(record.get(key))
+        rows.append(row)
+    return {"_keys": list(keys), "rows": rows}
+
+
+def _dumps_soa(table: dict) -> bytes:
+    """Render a to_soa table as UTF-8 JSON with one row per line"""
+    rows = b",\n    ".join(orjson.dumps(row) for row in table["rows"])
+    return b"".join([
+        b'{\n  "_keys": ', orjson.dumps(table["_keys"]),
+        b',\n  "rows": [\n    ', rows, b"\n  ]\n}"
+    ])
+
+
+def dc_table(data_centres: list) -> bytes:
+    """Data centres as a prompt table with the fixed DC_FLAT_KEYS columns"""
+    return _dumps_soa(to_soa(data_centres, DC_FLAT_KEYS))
+
+
+def regional_table(regional_signals: list) -> bytes:
+    """Regional signals as a prompt table (columns follow the fetched rows)"""
+    return _dumps_soa(to_soa(regional_signals, soa_keys(regional_signals)))
+
+
+# Output schemas shared by the single-task and batched prompts
+DC_OUTPUT_SCHEMA = """{
     "dc_id": "string - unique identifier",
     "name": "string - data centre name",
     "location_region": "string - UK region name",
-    "energy_profile": {{
+    "energy_profile": {
         "current_carbon_intensity_gco2": number,
         "regional_carbon_index": "string - very low/low/moderate/high/very high",
         "grid_stress_score": number (0-1),
         "wholesale_price_gbp_mwh": number,
-        "generation_mix": {{
+        "generation_mix": {
             "wind_pct": number,
             "solar_pct": number,
             "gas_pct": number,
             "nuclear_pct": number,
             "other_pct": number
-        }}
-    }},
-    "compute_profile": {{
+        }
+    },
+    "compute_profile": {
         "pue": number (Power Usage Effectiveness),
         "total_capacity_teraflops": number,
         "current_load_percentage": number or null,
         "flexibility_rating": number (0-1),
         "available_for_task": boolean
-    }},
+    },
     "suitability_score": number (0-100, based on task constraints vs DC capabilities)
-}}
+}"""
 
-## Task JSON Schema:
-{{
+TASK_OUTPUT_SCHEMA = """{
     "job_id": "string",
     "workload_type": "string",
     "urgency": "string - LOW/MEDIUM/HIGH/CRITICAL",
@@ -256,87 +707,298 @@ You must output a single JSON object with this exact structure:
     "deadline": "string ISO timestamp or null",
     "deferral_window_mins": number or null,
     "created_at": "string ISO timestamp"
+}"""
+
+LLM_INSTRUCTIONS = """1. For each data centre, match its location_region to the corresponding regional_signals to get accurate carbon intensity
+2. Use each data centre's _precomputed_suitability as its suitability_score (it already weighs carbon intensity vs carbon_cap, cost vs max_price, grid stress and load); only adjust it for urgency alignment or a violated constraint
+3. Set available_for_task to false if the DC cannot meet the task's constraints (_violates_constraints true is a strong signal)
+4. Output ONLY the JSON object, no explanations or markdown"""
+
+# Static prompt chunks, assembled per call around the JSON input blocks
+PROMPT_HEADER_TEMPLATE = """You are an energy-aware compute scheduling assistant. Using ONLY the data provided below, generate exactly {n_objects} JSON objects.
+
+## Required Output Format
+
+You must output a single JSON object with this exact structure:
+{{
+    "data_centre_options": [
+        // {n_dcs} JSON objects, one per data centre
+    ],
+    "task": {{
+        // 1 JSON object for the original task
+    }}
+}}
+
+"""
+
+PROMPT_INPUT_HEADER = """## Input Data (use ONLY this data):
+
+Data centres and regional signals are tables: "_keys" lists the field names once and each entry in "rows" maps positionally to _keys (dotted keys are nested fields, e.g. region_info.short_name).
+
+"""
+
+PROMPT_SCHEMA = f"""## Data Centre JSON Schema (repeat for each data centre):
+{DC_OUTPUT_SCHEMA}
+
+## Task JSON Schema:
+{TASK_OUTPUT_SCHEMA}
+
+"""
+
+PROMPT_INSTRUCTIONS = f"""
+
+## Instructions:
+{LLM_INSTRUCTIONS}
+
+OUTPUT:"""
+
+# Pre-encoded static chunks for prompt_builder
+PROMPT_BODY_BYTES = (PROMPT_SCHEMA + PROMPT_INPUT_HEADER + "### Task to Schedule:\n").encode()
+PROMPT_INSTRUCTIONS_BYTES = PROMPT_INSTRUCTIONS.encode()
+
+# Prompt memo: hash of the prompt input sections -> prompt text
+prompt_cache = OrderedDict()
+prompt_cache_lock = Lock()
+PROMPT_SECTIONS = ("task", "data_centres", "grid_signals", "regional_signals", "generation_mix")
+SNAPSHOT_SECTIONS = PROMPT_SECTIONS[1:]
+
+
+def context_hash(decision_context: dict, keys: tuple) -> bytes:
+    """Structural hash of the given decision context sections"""
+    sections = {key: decision_context.get(key) for key in keys}
+    return hashlib.blake2b(
+        orjson.dumps(sections, option=orjson.OPT_SORT_KEYS),
+        digest_size=16
+    ).digest()
+
+
+def build_llm_prompt(decision_context: dict) -> str:
+    """
+    Build the prompt for Gemini LLM. Prompts are memoized on a hash of the
+    sections they embed, so rebuilding for an unchanged context is a lookup.
+    """
+    ctx_hash = context_hash(decision_context, PROMPT_SECTIONS)
+
+    with prompt_cache_lock:
+        prompt = prompt_cache.get(ctx_hash)
+        if prompt is not None:
+            prompt_cache.move_to_end(ctx_hash)
+            return prompt
+
+    prompt = _render_llm_prompt(decision_context)
+
+    with prompt_cache_lock:
+        prompt_cache[ctx_hash] = prompt
+        while len(prompt_cache) > PROMPT_CACHE_MAX_ENTRIES:
+            prompt_cache.popitem(last=False)
+
+    return prompt
+
+
+@functools.lru_cache(maxsize=16)
+def prompt_builder(num_dcs: int):
+    """
+    Return a prompt builder specialized for num_dcs: the header and schema
+    are formatted and encoded once per fleet size (which rarely changes),
+    leaving only the JSON input blocks to append per call. orjson already
+    emits UTF-8 bytes, so everything goes into one bytearray decoded once.
+    """
+    prefix = PROMPT_HEADER_TEMPLATE.format(n_objects=num_dcs + 1, n_dcs=num_dcs).encode() + PROMPT_BODY_BYTES
+
+    def build(task_json: bytes, dcs_json: bytes, grid_json: bytes, regional_json: bytes, mix_json: bytes) -> str:
+        buf = bytearray(prefix)
+        buf += task_json
+        buf += b"\n\n### Available Data Centres:\n"
+        buf += dcs_json
+        buf += b"\n\n### Current Grid Signals (National):\n"
+        buf += grid_json
+        buf += b"\n\n### Regional Grid Signals:\n"
+        buf += regional_json
+        buf += b"\n\n### Generation Mix:\n"
+        buf += mix_json
+        buf += PROMPT_INSTRUCTIONS_BYTES
+        return buf.decode()
+
+    return build
+
+
+def _render_llm_prompt(decision_context: dict) -> str:
+    """Render the prompt text for a decision context"""
+    data_centres = decision_context.get("data_centres", [])
+
+    return prompt_builder(len(data_centres))(
+        _dumps_bytes(decision_context.get("task", {})),
+        dc_table(data_centres),
+        _dumps_bytes(decision_context.get("grid_signals", {})),
+        regional_table(decision_context.get("regional_signals", [])),
+        _dumps_bytes(decision_context.get("generation_mix", []))
+    )
+
+
+def build_llm_prompt_batch(decision_contexts: list) -> str:
+    """
+    Build one prompt covering several tasks that share the same grid and
+    data centre snapshot. The model returns one result per task, in order.
+    """
+    shared = decision_contexts[0]
+    num_dcs = len(shared.get("data_centres", []))
+    num_tasks = len(decision_contexts)
+    tasks = [ctx.get("task", {}) for ctx in decision_contexts]
+
+    return f"""You are an energy-aware compute scheduling assistant. Using ONLY the data provided below, evaluate every data centre for each of the {num_tasks} tasks.
+
+## Required Output Format
+
+You must output a single JSON object with this exact structure:
+{{
+    "results": [
+        // {num_tasks} objects, one per task in the same order as the input tasks:
+        {{
+            "data_centre_options": [
+                // {num_dcs} JSON objects, one per data centre
+            ],
+            "task": {{
+                // 1 JSON object for that task
+            }}
+        }}
+    ]
 }}
 
-## Input Data (use ONLY this data):
+## Data Centre JSON Schema (repeat for each of the {num_dcs} data centres in every result):
+{DC_OUTPUT_SCHEMA}
+
+## Task JSON Schema:
+{TASK_OUTPUT_SCHEMA}
 
-### Task to Schedule:
-{json.dumps(decision_context.get("task", {}), indent=2, default=str)}
+{PROMPT_INPUT_HEADER}### Tasks to Schedule (in order):
+{_dumps(tasks)}
 
 ### Available Data Centres:
-{json.dumps(decision_context.get("data_centres", []), indent=2, default=str)}
+{dc_table(shared.get("data_centres", [])).decode()}
 
 ### Current Grid Signals (National):
-{json.dumps(decision_context.get("grid_signals", {}), indent=2, default=str)}
+{_dumps(shared.get("grid_signals", {}))}
 
 ### Regional Grid Signals:
-{json.dumps(decision_context.get("regional_signals", []), indent=2, default=str)}
+{regional_table(shared.get("regional_signals", [])).decode()}
 
 ### Generation Mix:
-{json.dumps(decision_context.get("generation_mix", []), indent=2, default=str)}
+{_dumps(shared.get("generation_mix", []))}
 
 ## Instructions:
-1. For each data centre, match its location_region to the corresponding regional_signals to get accurate carbon intensity
-2. Calculate suitability_score based on: carbon intensity vs task's carbon_cap, price vs max_price, urgency alignment
-3. Set available_for_task to false if the DC cannot meet the task's constraints
-4. Output ONLY the JSON object, no explanations or markdown
+{LLM_INSTRUCTIONS}
+5. Evaluate each task independently and keep results in the same order as the input tasks
 
 OUTPUT:"""
 
-    return prompt
+
+async def stream_gemini_text(prompt: str) -> str:
+    """
+    Stream a Gemini response and return as soon as a complete top-level JSON
+    object has arrived, abandoning the rest of the stream. Raises ValueError
+    if the response grows past LLM_STREAM_MAX_CHARS.
+    """
+    models = gemini_client.aio.models
+    if not hasattr(models, "generate_content_stream"):
+        response = await models.generate_content(model=GEMINI_MODEL, contents=prompt)
+        return response.text
+
+    decoder = json.JSONDecoder()
+    parts = []
+    size = 0
+    stream = await models.generate_content_stream(model=GEMINI_MODEL, contents=prompt)
+    try:
+        async for chunk in stream:
+            text = chunk.text
+            if not text:
+                continue
+            parts.append(text)
+            size += len(text)
+            if size > LLM_STREAM_MAX_CHARS:
+                raise ValueError(f"Gemini response exceeded {LLM_STREAM_MAX_CHARS} characters")
+
+            if "}" not in text:
+                continue
+            buffered = "".join(parts)
+            start = buffered.find("{")
+            if start == -1:
+                continue
+            try:
+                decoder.raw_decode(buffered, start)
+            except json.JSONDecodeError:
+                continue
+            break
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    return "".join(parts)
 
 
-def call_gemini_llm(prompt: str, retry_count: int = 0) -> dict:
+async def call_gemini_llm_async(prompt: str) -> dict:
     """
-    Call Gemini LLM API using the official Google GenAI client.
+    Call Gemini LLM API using the async Google GenAI client.
     Returns parsed JSON or None on failure.
     """
     if not gemini_client:
         logger.error("Gemini client not initialized - check GEMINI_API_KEY")
         return None
 
-    try:
-        # Rate limiting
-        time.sleep(LLM_RATE_LIMIT)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        if attempt > 0:
+            logger.info("Retrying... (attempt %d/%d)", attempt + 1, LLM_MAX_RETRIES + 1)
 
-        logger.info(f"Calling Gemini LLM ({GEMINI_MODEL})...")
+        error = None
+        try:
+            logger.info("Calling Gemini LLM (%s)...", GEMINI_MODEL)
 
-        # Call Gemini using the official client
-        response = gemini_client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=prompt
-        )
+            # Cap concurrent requests and sustained rate; callers beyond the limit queue here
+            async with llm_semaphore:
+                await acquire_llm_token()
+                started = time.monotonic()
+                text = await stream_gemini_text(prompt)
+            record_gemini_outcome(False, time.monotonic() - started)
 
-        # Extract text from response
-        text = response.text
+            if not text:
+                logger.error("Empty response from Gemini")
+            else:
+                # Parse JSON from response
+                parsed = parse_llm_json_output(text)
+                if parsed is not None:
+                    return parsed
 
-        if not text:
-            logger.error("Empty response from Gemini")
-            if retry_count < LLM_MAX_RETRIES:
-                logger.info(f"Retrying... (attempt {retry_count + 2}/{LLM_MAX_RETRIES + 1})")
-                return call_gemini_llm(prompt, retry_count + 1)
-            return None
+                logger.error("Failed to parse LLM output as JSON")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Raw LLM output: %s...", text[:500])
 
-        # Parse JSON from response
-        parsed = parse_llm_json_output(text)
+        except Exception as e:
+            logger.error("Gemini API exception: %s", e)
+            error = e
+            if is_rate_limit_error(e):
+                record_gemini_outcome(True)
 
-        if parsed is None:
-            logger.error("Failed to parse LLM output as JSON")
-            logger.debug(f"Raw LLM output: {text[:500]}...")
-            if retry_count < LLM_MAX_RETRIES:
-                logger.info(f"Retrying due to parse failure... (attempt {retry_count + 2}/{LLM_MAX_RETRIES + 1})")
-                return call_gemini_llm(prompt, retry_count + 1)
-            return None
+        if attempt < LLM_MAX_RETRIES:
+            delay = retry_delay_for(error, attempt)
+            if error is not None and is_rate_limit_error(error):
+                logger.warning("Gemini rate limited (recent rate %.0f%%), waiting %.1fs", gemini_error_rate() * 100, delay)
+            await asyncio.sleep(delay)
 
-        return parsed
+    return None
 
-    except Exception as e:
-        logger.error(f"Gemini API exception: {e}")
-        if retry_count < LLM_MAX_RETRIES:
-            logger.info(f"Retrying after error... (attempt {retry_count + 2}/{LLM_MAX_RETRIES + 1})")
-            time.sleep(1)  # Brief delay before retry
-            return call_gemini_llm(prompt, retry_count + 1)
-        return None
+
+def call_gemini_llm(prompt: str, retry_count: int = None) -> dict:
+    """Blocking wrapper around call_gemini_llm_async for sync callers"""
+    if retry_count is not None:
+        warnings.warn(
+            "call_gemini_llm(retry_count=...) is deprecated and ignored; retries are handled internally",
+            DeprecationWarning,
+            stacklevel=2
+        )
+    return run_on_llm_loop(call_gemini_llm_async(prompt))
+
+
+JSON_FENCE_RE = re.compile(r'```(?:json)?\s*([\s\S]*?)\s*```')
 
 
 def parse_llm_json_output(text: str) -> dict:
@@ -347,15 +1009,16 @@ def parse_llm_json_output(text: str) -> dict:
     # Remove markdown code blocks if present
     text = text.strip()
 
-    # Try to find JSON in code blocks
-    json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', text)
-    if json_match:
-        text = json_match.group(1)
+    # Try to find JSON in code blocks (skip the regex when there is no fence)
+    if "```" in text:
+        json_match = JSON_FENCE_RE.search(text)
+        if json_match:
+            text = json_match.group(1)
 
     # Try direct parse
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
         pass
 
     # Try to find JSON object in text
@@ -372,76 +1035,385 @@ def parse_llm_json_output(text: str) -> dict:
     return None
 
 
-def validate_llm_output(output: dict, expected_dc_count: int) -> bool:
+# Structural schema for one LLM answer, compiled once into LLM_OUTPUT_VALIDATOR
+NUMBER_OR_NULL = {"type": ["number", "null"]}
+LLM_OUTPUT_SCHEMA = {
+    "type": "object",
+    "required": ["data_centre_options", "task"],
+    "properties": {
+        "data_centre_options": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["dc_id"],
+                "properties": {
+                    "dc_id": {"type": "string"},
+                    "name": {"type": ["string", "null"]},
+                    "location_region": {"type": ["string", "null"]},
+                    "energy_profile": {
+                        "type": "object",
+                        "properties": {
+                            "current_carbon_intensity_gco2": NUMBER_OR_NULL,
+                            "grid_stress_score": {"type": ["number", "null"], "minimum": 0, "maximum": 1},
+                            "wholesale_price_gbp_mwh": NUMBER_OR_NULL,
+                            "generation_mix": {"type": ["object", "null"]}
+                        }
+                    },
+                    "compute_profile": {
+                        "type": "object",
+                        "properties": {
+                            "pue": NUMBER_OR_NULL,
+                            "total_capacity_teraflops": NUMBER_OR_NULL,
+                            "current_load_percentage": NUMBER_OR_NULL,
+                            "flexibility_rating": NUMBER_OR_NULL,
+                            "available_for_task": {"type": "boolean"}
+                        }
+                    },
+                    "suitability_score": {"type": "number", "minimum": 0, "maximum": 100}
+                }
+            }
+        },
+        "task": {"type": "object"}
+    }
+}
+
+JSON_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None
+}
+
+
+def compile_validator(schema: dict, path: str = "$"):
     """
-    Validate that LLM output has correct structure:
-    - data_centre_options array with expected_dc_count items
-    - task object
+    Compile a JSON-schema subset (type, required, properties, items,
+    minimum, maximum) into a nested closure, so the schema is walked once at
+    import rather than on every validation. The returned function raises
+    ValueError naming the first offending path.
     """
-    if not isinstance(output, dict):
-        logger.error("LLM output is not a dictionary")
-        return False
+    types = schema.get("type")
+    types = [types] if isinstance(types, str) else (types or [])
+    type_checks = [JSON_TYPE_CHECKS[t] for t in types]
+    required = schema.get("required", [])
+    properties = [
+        (key, compile_validator(sub, f"{path}.{key}"))
+        for key, sub in schema.get("properties", {}).items()
+    ]
+    items = compile_validator(schema["items"], f"{path}[]") if "items" in schema else None
+    minimum = schema.get("minimum")
+    maximum = schema.get("maximum")
+
+    def validate(value):
+        if type_checks and not any(check(value) for check in type_checks):
+            raise ValueError(f"{path} must be {' or '.join(types)}, got {type(value).__name__}")
+        if isinstance(value, dict):
+            for key in required:
+                if key not in value:
+                    raise ValueError(f"{path}.{key} is required")
+            for key, check in properties:
+                if key in value:
+                    check(value[key])
+        elif isinstance(value, list) and items is not None:
+            for item in value:
+                items(item)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if minimum is not None and value < minimum:
+                raise ValueError(f"{path} must be >= {minimum}, got {value}")
+            if maximum is not None and value > maximum:
+                raise ValueError(f"{path} must be <= {maximum}, got {value}")
+
+    return validate
+
+
+LLM_OUTPUT_VALIDATOR = compile_validator(LLM_OUTPUT_SCHEMA)
 
-    dc_options = output.get("data_centre_options", [])
-    task = output.get("task")
 
-    if not isinstance(dc_options, list):
-        logger.error("data_centre_options is not a list")
+def validate_llm_output(output: dict, expected_dc_count: int) -> bool:
+    """
+    Validate that LLM output matches LLM_OUTPUT_SCHEMA, including the nested
+    DC fields log_orchestration_decision and DC selection rely on.
+    A DC count other than expected_dc_count is only logged.
+    """
+    try:
+        LLM_OUTPUT_VALIDATOR(output)
+    except ValueError as e:
+        logger.error("LLM output failed schema validation: %s", e)
         return False
 
-    if len(dc_options) != expected_dc_count:
-        logger.warning(f"Expected {expected_dc_count} DCs, got {len(dc_options)}")
+    dc_count = len(output["data_centre_options"])
+    if dc_count != expected_dc_count:
+        logger.warning("Expected %d DCs, got %d", expected_dc_count, dc_count)
         # Allow this to pass but log warning
 
-    if not isinstance(task, dict):
-        logger.error("task is not a dictionary")
-        return False
-
     return True
 
 
-def process_with_llm(decision_context: dict) -> dict:
+# Answer cache: quantized decision context fingerprint -> (stored_at, LLM output)
+llm_answer_cache = OrderedDict()
+llm_answer_cache_lock = Lock()
+
+
+def _bucket(value, step: float):
+    """Quantize a numeric value to a bucket index (None passes through)"""
+    if value is None:
+        return None
+    try:
+        return round(float(value) / step)
+    except (TypeError, ValueError):
+        return None
+
+
+def _nullable_sort_key(row: list) -> list:
+    """Sort key for rows that may hold None (None sorts first instead of raising TypeError)"""
+    return [(value is not None, value) for value in row]
+
+
+def llm_cache_key(decision_context: dict) -> str:
+    """
+    Fingerprint a decision context so that contexts differing only by small
+    grid fluctuations map to the same cached LLM answer.
+    """
+    task = decision_context.get("task") or {}
+    latest = (decision_context.get("grid_signals") or {}).get("latest") or {}
+
+    quantized = {
+        "task": [
+            task.get("workload_type"),
+            task.get("urgency"),
+            _bucket(task.get("required_gpu_mins"), 5),
+            task.get("required_cpu_cores"),
+            task.get("required_memory_gb"),
+            task.get("carbon_cap_gco2"),
+            task.get("max_price_gbp"),
+            task.get("deferral_window_mins")
+        ],
+        "grid": [
+            _bucket(latest.get("carbon_intensity_forecast"), 10),
+            _bucket(latest.get("grid_stress_score"), 0.05),
+            _bucket(latest.get("wholesale_price_gbp_mwh"), 5)
+        ],
+        "data_centres": sorted(
+            (
+                [
+                    dc.get("dc_id"),
+                    dc.get("status"),
+                    _bucket(dc.get("current_carbon_intensity"), 10),
+                    _bucket(dc.get("current_load_percentage"), 5)
+                ]
+                for dc in decision_context.get("data_centres", [])
+            ),
+            key=_nullable_sort_key
+        ),
+        "regions": sorted(
+            (
+                [
+                    (signal.get("regions") or {}).get("short_name"),
+                    _bucket(signal.get("carbon_intensity_forecast"), 10)
+                ]
+                for signal in decision_context.get("regional_signals", [])
+            ),
+            key=_nullable_sort_key
+        )
+    }
+
+    encoded = orjson.dumps(quantized, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def get_cached_llm_output(key: str) -> dict:
+    """Return a copy of a fresh cached LLM answer, or None"""
+    with llm_answer_cache_lock:
+        entry = llm_answer_cache.get(key)
+        if entry is None:
+            return None
+        stored_at, output = entry
+        if time.monotonic() - stored_at > LLM_CACHE_TTL:
+            del llm_answer_cache[key]
+            return None
+        llm_answer_cache.move_to_end(key)
+        return copy.deepcopy(output)
+
+
+def put_cached_llm_output(key: str, output: dict):
+    """Cache an LLM answer, evicting the least recently used entry when full"""
+    with llm_answer_cache_lock:
+        llm_answer_cache[key] = (time.monotonic(), copy.deepcopy(output))
+        llm_answer_cache.move_to_end(key)
+        while len(llm_answer_cache) > LLM_CACHE_MAX_ENTRIES:
+            llm_answer_cache.popitem(last=False)
+
+
+async def process_with_llm_async(decision_context: dict) -> dict:
     """
     Process decision context through Gemini LLM.
     Returns structured output with n DC JSONs + 1 task JSON.
+    Similar contexts seen within LLM_CACHE_TTL reuse the cached answer.
+    Expects a context already passed through _normalize_for_json.
     """
     num_dcs = len(decision_context.get("data_centres", []))
-    logger.info(f"Calling Gemini LLM for {num_dcs} data centres...")
+    cache_key = llm_cache_key(decision_context)
+    llm_output = get_cached_llm_output(cache_key)
+    cache_hit = llm_output is not None
+
+    if cache_hit:
+        logger.info("LLM answer cache hit for %d data centres", num_dcs)
+        # The cached answer belongs to another job - swap in this task
+        llm_output["task"] = {k: v for k, v in decision_context.get("task", {}).items() if k != "status"}
+    else:
+        logger.info("Calling Gemini LLM for %d data centres...", num_dcs)
 
-    prompt = build_llm_prompt(decision_context)
-    llm_output = call_gemini_llm(prompt)
+        annotate_suitability(decision_context)
+        prompt = build_llm_prompt(decision_context)
+        llm_output = await call_gemini_llm_async(prompt)
 
-    if llm_output is None:
-        logger.error("Failed to get valid LLM output after retries")
-        return None
+        if llm_output is None:
+            logger.error("Failed to get valid LLM output after retries")
+            return None
 
-    if not validate_llm_output(llm_output, num_dcs):
-        logger.error("LLM output validation failed")
-        return None
+        if not validate_llm_output(llm_output, num_dcs):
+            logger.error("LLM output validation failed")
+            return None
+
+        put_cached_llm_output(cache_key, llm_output)
+
+    return attach_llm_metadata(llm_output, decision_context, cache_hit)
+
+
+def summarize_dc_options(dc_options: list) -> tuple:
+    """
+    Single pass over the LLM's DC options returning (alternatives,
+    recommended_dc): the audit-log view of every option, and the highest
+    scored DC available for the task (any DC if none is available).
+    """
+    alternatives = []
+    best_available = None
+    best_any = None
+    for dc_opt in dc_options:
+        available = (dc_opt.get("compute_profile") or {}).get("available_for_task")
+        alternatives.append({
+            "dc_id": dc_opt.get("dc_id"),
+            "name": dc_opt.get("name"),
+            "suitability_score": dc_opt.get("suitability_score"),
+            "available_for_task": available
+        })
+        score = dc_opt.get("suitability_score") or 0
+        if best_any is None or score > best_any[0]:
+            best_any = (score, dc_opt)
+        if available and (best_available is None or score > best_available[0]):
+            best_available = (score, dc_opt)
 
-    # Add metadata
+    best = best_available or best_any
+    return alternatives, best[1] if best else None
+
+
+def attach_llm_metadata(llm_output: dict, decision_context: dict, cache_hit: bool) -> dict:
+    """
+    Add the _metadata block BPP uses to identify an LLM output, including the
+    precomputed alternatives and recommended DC used for decision logging.
+    """
+    alternatives, recommended_dc = summarize_dc_options(llm_output.get("data_centre_options", []))
     llm_output["_metadata"] = {
         "task_id": decision_context.get("task", {}).get("job_id"),
         "context_id": decision_context.get("id"),
-        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "generated_at": _iso_now(),
         "dc_count": len(llm_output.get("data_centre_options", [])),
-        "model": GEMINI_MODEL
+        "model": GEMINI_MODEL,
+        "cache_hit": cache_hit,
+        "alternatives": alternatives,
+        "recommended_dc": recommended_dc
     }
 
-    logger.info(f"LLM output generated successfully with {len(llm_output.get('data_centre_options', []))} DC options")
+    logger.info("LLM output generated successfully with %d DC options", llm_output["_metadata"]["dc_count"])
     return llm_output
 
 
+async def process_with_llm_batch_async(decision_contexts: list) -> list:
+    """
+    Process several decision contexts with as few Gemini calls as possible.
+    Cache hits are answered directly; the rest are grouped by shared grid/DC
+    snapshot and sent LLM_BATCH_MAX tasks per call, with the calls running
+    concurrently. Results are returned in input order (None for failures).
+    """
+    results = [None] * len(decision_contexts)
+    groups = OrderedDict()
+
+    for index, ctx in enumerate(decision_contexts):
+        cache_key = llm_cache_key(ctx)
+        cached = get_cached_llm_output(cache_key)
+        if cached is not None:
+            cached["task"] = {k: v for k, v in ctx.get("task", {}).items() if k != "status"}
+            results[index] = attach_llm_metadata(cached, ctx, True)
+        else:
+            # Scores are task-specific, so only tasks with identical scored DCs share a batch
+            annotate_suitability(ctx)
+            groups.setdefault(context_hash(ctx, SNAPSHOT_SECTIONS), []).append((index, ctx, cache_key))
+
+    chunks = [
+        items[start:start + LLM_BATCH_MAX]
+        for items in groups.values()
+        for start in range(0, len(items), LLM_BATCH_MAX)
+    ]
+
+    async def run_chunk(chunk):
+        if len(chunk) == 1:
+            index, ctx, _ = chunk[0]
+            results[index] = await process_with_llm_async(ctx)
+            return
+
+        contexts = [ctx for _, ctx, _ in chunk]
+        num_dcs = len(contexts[0].get("data_centres", []))
+        logger.info("Calling Gemini LLM for %d batched tasks over %d data centres...", len(chunk), num_dcs)
+        output = await call_gemini_llm_async(build_llm_prompt_batch(contexts))
+        batch_results = output.get("results") if isinstance(output, dict) else None
+        if not isinstance(batch_results, list):
+            batch_results = []
+
+        for position, (index, ctx, cache_key) in enumerate(chunk):
+            candidate = batch_results[position] if position < len(batch_results) else None
+            if candidate is not None and validate_llm_output(candidate, num_dcs):
+                put_cached_llm_output(cache_key, candidate)
+                results[index] = attach_llm_metadata(candidate, ctx, False)
+            else:
+                logger.warning("Batched LLM result missing or invalid for task %s, retrying individually", ctx.get("task", {}).get("job_id"))
+                results[index] = await process_with_llm_async(ctx)
+
+    await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+    return results
+
+
+def process_with_llm(decision_context: dict) -> dict:
+    """Blocking wrapper around process_with_llm_async for sync callers"""
+    return run_on_llm_loop(process_with_llm_async(_normalize_for_json(decision_context)))
+
+
+def process_many_with_llm(decision_contexts: list) -> list:
+    """Blocking wrapper around process_with_llm_batch_async for sync callers"""
+    return run_on_llm_loop(process_with_llm_batch_async(_normalize_for_json(decision_contexts)))
+
+
+def llm_output_meta(output: dict, key: str):
+    """Read output["_metadata"][key]; None if output, its metadata or the key is missing"""
+    try:
+        return output["_metadata"][key]
+    except (KeyError, TypeError):
+        return None
+
+
 def store_llm_output(output: dict):
-    """Store LLM output for BPP access"""
-    with llm_output_store["lock"]:
-        llm_output_store["latest"] = output
-        llm_output_store["history"].append(output)
-        # Keep only last 100 outputs
-        if len(llm_output_store["history"]) > 100:
-            llm_output_store["history"] = llm_output_store["history"][-100:]
+    """Queue LLM output for BPP access"""
+    global llm_output_state
+
+    with llm_output_lock:
+        pending, history = llm_output_state
+        if len(pending) >= LLM_PENDING_MAX:
+            logger.warning("LLM output queue full - dropping unacknowledged task: %s", llm_output_meta(pending[0], "task_id"))
+            pending = pending[1:]
+        llm_output_state = (pending + (output,), (history + (output,))[-LLM_HISTORY_SIZE:])
 
-    logger.info(f"LLM output stored - task: {output.get('_metadata', {}).get('task_id')}")
+    logger.info("LLM output stored - task: %s", llm_output_meta(output, "task_id"))
 
 
 # =============================================================================
@@ -502,7 +1474,7 @@ def update_agent_state(client: Client, status: str, state_data: dict = None, tri
         # Update agent record
         update_data = {
             "status": status,
-            "last_action_at": datetime.now(timezone.utc).isoformat()
+            "last_action_at": _iso_now()
         }
         if state_data:
             update_data["current_task"] = state_data
@@ -518,7 +1490,7 @@ def update_agent_state(client: Client, status: str, state_data: dict = None, tri
             "status": status,
             "state_data": state_data or {},
             "triggered_by": triggered_by or "system",
-            "recorded_at": datetime.now(timezone.utc).isoformat()
+            "recorded_at": _iso_now()
         }
 
         client.table("agent_states") \
@@ -532,6 +1504,33 @@ def update_agent_state(client: Client, status: str, state_data: dict = None, tri
         logger.error(f"Failed to update agent state: {e}")
 
 
+# bg_log_decision RPC (migration_add_bg_log_decision_rpc.sql); disabled if the function is not installed
+decision_rpc_available = True
+decision_lookup_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="decision-lookup")
+
+# PostgREST / Postgres error codes for an RPC whose function does not exist
+MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+
+def is_missing_function_error(error: Exception) -> bool:
+    """Check whether an RPC failed because its function is not installed"""
+    if getattr(error, "code", None) in MISSING_FUNCTION_CODES:
+        return True
+    message = str(error)
+    return any(code in message for code in MISSING_FUNCTION_CODES)
+
+
+def lookup_uuid(client: Client, table: str, column: str, value: str) -> str:
+    """Resolve a business key to its row UUID (None if missing)"""
+    if not value:
+        return None
+    result = client.table(table) \
+        .select("id") \
+        .eq(column, value) \
+        .execute()
+    return result.data[0]["id"] if result.data else None
+
+
 def log_orchestration_decision(
     client: Client,
     decision_type: str,
@@ -553,25 +1552,10 @@ def log_orchestration_decision(
         decision_context: The decision context used (optional)
         recommended_dc: The highest-scored DC from LLM (optional)
     """
+    global decision_rpc_available
+
     try:
-        # Look up workload UUID
-        workload_uuid = None
-        wl_result = client.table("compute_workloads") \
-            .select("id") \
-            .eq("job_id", workload_job_id) \
-            .execute()
-        if wl_result.data:
-            workload_uuid = wl_result.data[0]["id"]
-
-        # Look up target DC UUID if recommended
-        target_dc_uuid = None
-        if recommended_dc and recommended_dc.get("dc_id"):
-            dc_result = client.table("data_centres") \
-                .select("id") \
-                .eq("dc_id", recommended_dc.get("dc_id")) \
-                .execute()
-            if dc_result.data:
-                target_dc_uuid = dc_result.data[0]["id"]
+        target_dc_code = recommended_dc.get("dc_id") if recommended_dc else None
 
         # Extract grid metrics from decision context
         input_carbon = None
@@ -594,35 +1578,55 @@ def log_orchestration_decision(
                 "deadline": task.get("deadline")
             }
 
-        # Build alternatives considered (all DC options from LLM)
-        alternatives = []
-        if llm_output and llm_output.get("data_centre_options"):
-            for dc_opt in llm_output["data_centre_options"]:
-                alternatives.append({
-                    "dc_id": dc_opt.get("dc_id"),
-                    "name": dc_opt.get("name"),
-                    "suitability_score": dc_opt.get("suitability_score"),
-                    "available_for_task": dc_opt.get("compute_profile", {}).get("available_for_task")
-                })
+        # Alternatives considered (all DC options from LLM), precomputed by attach_llm_metadata
+        alternatives = (llm_output or {}).get("_metadata", {}).get("alternatives", [])
 
         decision_data = {
             "decision_id": str(uuid.uuid4()),
             "decision_type": decision_type,
             "agent_id": bg_agent_state["agent_uuid"],
-            "workload_id": workload_uuid,
-            "target_dc_id": target_dc_uuid,
             "input_carbon_intensity": input_carbon,
             "input_grid_stress": input_stress,
             "input_price_gbp_mwh": input_price,
             "reasoning": reasoning,
             "constraints_evaluated": constraints,
             "alternatives_considered": alternatives,
-            "decided_at": datetime.now(timezone.utc).isoformat()
+            "decided_at": _iso_now()
         }
 
         # Remove None values
         decision_data = {k: v for k, v in decision_data.items() if v is not None}
 
+        # Preferred path: one round-trip, UUID lookups resolved server-side
+        if decision_rpc_available:
+            try:
+                result = client.rpc("bg_log_decision", {
+                    "p_job_id": workload_job_id,
+                    "p_dc_id": target_dc_code,
+                    "p_payload": decision_data
+                }).execute()
+                if result.data:
+                    logger.info(f"Orchestration decision logged: {decision_type} for {workload_job_id}")
+                    return result.data[0]
+                return {}
+            except Exception as e:
+                # The RPC may have committed before the error; inserting again would duplicate the row
+                if not is_missing_function_error(e):
+                    logger.error(f"Failed to log orchestration decision via bg_log_decision: {e}")
+                    return {}
+                decision_rpc_available = False
+                logger.warning(f"bg_log_decision RPC unavailable, using client-side lookups: {e}")
+
+        # Fallback: run both UUID lookups concurrently, then insert
+        workload_future = decision_lookup_pool.submit(lookup_uuid, client, "compute_workloads", "job_id", workload_job_id)
+        dc_future = decision_lookup_pool.submit(lookup_uuid, client, "data_centres", "dc_id", target_dc_code)
+        workload_uuid = workload_future.result()
+        target_dc_uuid = dc_future.result()
+        if workload_uuid:
+            decision_data["workload_id"] = workload_uuid
+        if target_dc_uuid:
+            decision_data["target_dc_id"] = target_dc_uuid
+
         result = client.table("orchestration_decisions") \
             .insert(decision_data) \
             .execute()
@@ -641,6 +1645,28 @@ def log_orchestration_decision(
 # TRIGGER QUEUE MONITOR
 # =============================================================================
 
+CONTEXT_INPUTS = ("grid_signals", "regional_signals", "data_centres", "generation_mix")
+
+# Workload fields copied into decision_context["task"] (ordered, so prompts are stable)
+TASK_KEYS = (
+    "job_id", "workload_type", "urgency", "status", "required_gpu_mins", "required_cpu_cores",
+    "required_memory_gb", "estimated_energy_kwh", "carbon_cap_gco2", "max_price_gbp",
+    "deadline", "deferral_window_mins", "created_at"
+)
+
+# Columns the decision context and prompt actually use, instead of select("*")
+GRID_SIGNAL_COLUMNS = (
+    "timestamp, carbon_intensity_forecast, carbon_intensity_actual, carbon_index, "
+    "demand_mw, grid_stress_score, wholesale_price_gbp_mwh"
+)
+REGIONAL_SIGNAL_COLUMNS = "timestamp, carbon_intensity_forecast, carbon_index, regions(short_name, country, region_id)"
+DATA_CENTRE_COLUMNS = (
+    "id, dc_id, name, location_region, pue, total_capacity_teraflops, flexibility_rating, "
+    "current_carbon_intensity, current_load_percentage, status, region_info:regions(short_name, country)"
+)
+GENERATION_MIX_COLUMNS = "timestamp, fuel_type, percentage"
+
+
 class TriggerQueueMonitor:
     """
     Monitors the workload_notifications table (populated by database trigger)
@@ -648,19 +1674,105 @@ class TriggerQueueMonitor:
     """
 
     def __init__(self, url: str, key: str):
-        self.client: Client = create_client(url, key)
+        # One keep-alive HTTP session (HTTP/2 when h2 is installed) so the
+        # parallel context fetches reuse connections across polls
+        self.http_client = httpx.Client(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_keepalive_connections=SUPABASE_MAX_KEEPALIVE)
+        )
+        try:
+            self.client: Client = create_client(url, key, options=ClientOptions(httpx_client=self.http_client))
+        except TypeError:
+            # supabase-py before httpx_client support - it manages its own session
+            self.client = create_client(url, key)
+        # Runs the four decision-context queries concurrently (one worker per query)
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sb-fetch")
+        # Runs claimed batches (LLM call, logging, broadcast) off the poll thread;
+        # a single worker keeps one decision context in flight
+        self.llm_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bg-llm")
+        self._batch_future = None
         self.running = False
         self.thread = None
+        self._idle_cycles = 0
+        self._fetch_cache = {}  # name -> (expires_at, rows)
+        self._fetch_cache_lock = Lock()
+        self._snapshot_rpc_available = True
+        self._listen_conn = None
+        self._last_snapshot = None  # (context inputs, snapshot, built_at) of the last context built
+        self._unprocessed = (None, 0.0)  # (unprocessed notification count, monotonic time it was known exact)
+        self._unprocessed_lock = Lock()
+
+    def _cached_fetch(self, name: str, query) -> list:
+        """
+        Return rows for name from the TTL cache (CONTEXT_CACHE_TTL), running
+        query() on a miss. Failed queries are not cached and evict the entry.
+        """
+        now = time.monotonic()
+        with self._fetch_cache_lock:
+            entry = self._fetch_cache.get(name)
+            if entry and entry[0] > now:
+                return entry[1]
+
+        try:
+            rows = query()
+        except Exception:
+            with self._fetch_cache_lock:
+                self._fetch_cache.pop(name, None)
+            raise
+
+        with self._fetch_cache_lock:
+            self._fetch_cache[name] = (now + CONTEXT_CACHE_TTL[name], rows)
+        return rows
+
+    def fetch_context_inputs(self) -> tuple:
+        """
+        Return (grid_signals, regional_signals, data_centres, generation_mix).
+        Serves fresh cache entries when all four are cached; otherwise uses
+        the get_decision_context_snapshot RPC (one round-trip), falling back
+        to the four queries in parallel if the RPC fails (for good only if it
+        is not installed).
+        """
+        now = time.monotonic()
+        with self._fetch_cache_lock:
+            all_cached = all(
+                name in self._fetch_cache and self._fetch_cache[name][0] > now
+                for name in CONTEXT_INPUTS
+            )
+
+        if self._snapshot_rpc_available and not all_cached:
+            try:
+                snapshot = self.client.rpc("get_decision_context_snapshot").execute().data or {}
+                inputs = tuple(snapshot.get(name) or [] for name in CONTEXT_INPUTS)
+                with self._fetch_cache_lock:
+                    for name, rows in zip(CONTEXT_INPUTS, inputs):
+                        self._fetch_cache[name] = (now + CONTEXT_CACHE_TTL[name], rows)
+                return inputs
+            except Exception as e:
+                if is_missing_function_error(e):
+                    self._snapshot_rpc_available = False
+                    logger.warning(f"get_decision_context_snapshot RPC unavailable, using separate queries: {e}")
+                else:
+                    logger.warning(f"get_decision_context_snapshot RPC failed, using separate queries for this fetch: {e}")
+
+        futures = [
+            self.executor.submit(fetch)
+            for fetch in (
+                self.fetch_latest_grid_signals,
+                self.fetch_latest_regional_signals,
+                self.fetch_data_centres,
+                self.fetch_latest_generation_mix
+            )
+        ]
+        return tuple(f.result() for f in futures)
 
     def fetch_latest_grid_signals(self) -> list:
         """Fetch the most recent grid signals"""
         try:
-            result = self.client.table("grid_signals") \
-                .select("*") \
-                .order("timestamp", desc=True) \
-                .limit(10) \
-                .execute()
-            return result.data or []
+            return self._cached_fetch("grid_signals", lambda: self.client.table("grid_signals")
+                .select(GRID_SIGNAL_COLUMNS)
+                .order("timestamp", desc=True)
+                .limit(10)
+                .execute().data or [])
         except Exception as e:
             logger.error(f"Error fetching grid signals: {e}")
             return []
@@ -668,12 +1780,11 @@ class TriggerQueueMonitor:
     def fetch_latest_regional_signals(self) -> list:
         """Fetch the most recent regional grid signals with region info"""
         try:
-            result = self.client.table("regional_grid_signals") \
-                .select("*, regions(short_name, country, region_id)") \
-                .order("timestamp", desc=True) \
-                .limit(20) \
-                .execute()
-            return result.data or []
+            return self._cached_fetch("regional_signals", lambda: self.client.table("regional_grid_signals")
+                .select(REGIONAL_SIGNAL_COLUMNS)
+                .order("timestamp", desc=True)
+                .limit(20)
+                .execute().data or [])
         except Exception as e:
             logger.error(f"Error fetching regional signals: {e}")
             return []
@@ -681,11 +1792,10 @@ class TriggerQueueMonitor:
     def fetch_data_centres(self) -> list:
         """Fetch all active data centres with their current state"""
         try:
-            result = self.client.table("data_centres") \
-                .select("*, regions(short_name, country)") \
-                .eq("status", "ACTIVE") \
-                .execute()
-            return result.data or []
+            return self._cached_fetch("data_centres", lambda: self.client.table("data_centres")
+                .select(DATA_CENTRE_COLUMNS)
+                .eq("status", "ACTIVE")
+                .execute().data or [])
         except Exception as e:
             logger.error(f"Error fetching data centres: {e}")
             return []
@@ -693,12 +1803,11 @@ class TriggerQueueMonitor:
     def fetch_latest_generation_mix(self) -> list:
         """Fetch the most recent generation mix"""
         try:
-            result = self.client.table("generation_mix") \
-                .select("*") \
-                .order("timestamp", desc=True) \
-                .limit(20) \
-                .execute()
-            return result.data or []
+            return self._cached_fetch("generation_mix", lambda: self.client.table("generation_mix")
+                .select(GENERATION_MIX_COLUMNS)
+                .order("timestamp", desc=True)
+                .limit(20)
+                .execute().data or [])
         except Exception as e:
             logger.error(f"Error fetching generation mix: {e}")
             return []
@@ -708,61 +1817,69 @@ class TriggerQueueMonitor:
         Create a comprehensive decision context with all data needed
         to choose which data centre to send the task to.
         """
-        # Fetch all relevant data
-        grid_signals = self.fetch_latest_grid_signals()
-        regional_signals = self.fetch_latest_regional_signals()
-        data_centres = self.fetch_data_centres()
-        generation_mix = self.fetch_latest_generation_mix()
+        last = self._last_snapshot
+        deferrable = (
+            workload.get("urgency") == "LOW"
+            and (workload.get("deferral_window_mins") or 0) > DEFERRAL_CACHE_THRESHOLD
+        )
+        if deferrable and last is not None and time.monotonic() - last[2] < DEFERRAL_SNAPSHOT_MAX_AGE:
+            # Fast path: a slightly older grid picture is fine for a task
+            # that can wait hours, so skip the Supabase fetches entirely
+            snapshot = last[1]
+        else:
+            # Fetch all relevant data (cache, snapshot RPC, or parallel queries)
+            inputs = self.fetch_context_inputs()
+
+            # While the inputs are the same cached rows (a burst inside the fetch
+            # cache TTL), reuse the previous snapshot slices and summary and only
+            # rebuild the task part
+            if last is not None and all(new is old for new, old in zip(inputs, last[0])):
+                snapshot = last[1]
+            else:
+                snapshot = self.build_context_snapshot(*inputs)
+                self._last_snapshot = (inputs, snapshot, time.monotonic())
 
         # Build the decision context
-        context = {
+        return {
             "id": str(uuid.uuid4()),
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": _iso_now(),
             "processed": False,
 
             # The task/workload to be scheduled
-            "task": {
-                "job_id": workload.get("job_id"),
-                "workload_type": workload.get("workload_type"),
-                "urgency": workload.get("urgency"),
-                "status": workload.get("status"),
-                "required_gpu_mins": workload.get("required_gpu_mins"),
-                "required_cpu_cores": workload.get("required_cpu_cores"),
-                "required_memory_gb": workload.get("required_memory_gb"),
-                "estimated_energy_kwh": workload.get("estimated_energy_kwh"),
-                "carbon_cap_gco2": workload.get("carbon_cap_gco2"),
-                "max_price_gbp": workload.get("max_price_gbp"),
-                "deadline": workload.get("deadline"),
-                "deferral_window_mins": workload.get("deferral_window_mins"),
-                "created_at": workload.get("created_at")
-            },
+            "task": {key: workload.get(key) for key in TASK_KEYS},
 
-            # Current grid state (national)
+            # Grid, regional, DC and generation mix slices (shared, read-only)
+            **snapshot,
+            "summary": dict(snapshot["summary"])
+        }
+
+    def build_context_snapshot(self, grid_signals: list, regional_signals: list,
+                               data_centres: list, generation_mix: list) -> dict:
+        """Build the task-independent part of a decision context"""
+        # Lowest carbon DC
+        lowest_dc = None
+        lowest_dc_carbon = None
+        for dc in data_centres:
+            carbon = dc.get("current_carbon_intensity") or 9999
+            if lowest_dc is None or carbon < lowest_dc_carbon:
+                lowest_dc, lowest_dc_carbon = dc, carbon
+
+        latest_gs = grid_signals[0] if grid_signals else None
+
+        snapshot = {
+            # Current grid state (national); the fetch already limits it to 10 rows
             "grid_signals": {
-                "latest": grid_signals[0] if grid_signals else None,
-                "forecast": grid_signals[:10] if grid_signals else []
+                "latest": latest_gs,
+                "forecast": grid_signals
             },
 
             # Regional carbon intensities
             "regional_signals": regional_signals,
 
-            # Available data centres with their specs
-            "data_centres": [
-                {
-                    "id": dc.get("id"),
-                    "dc_id": dc.get("dc_id"),
-                    "name": dc.get("name"),
-                    "location_region": dc.get("location_region"),
-                    "region_info": dc.get("regions"),
-                    "pue": dc.get("pue"),
-                    "total_capacity_teraflops": dc.get("total_capacity_teraflops"),
-                    "flexibility_rating": dc.get("flexibility_rating"),
-                    "current_carbon_intensity": dc.get("current_carbon_intensity"),
-                    "current_load_percentage": dc.get("current_load_percentage"),
-                    "status": dc.get("status")
-                }
-                for dc in data_centres
-            ],
+            # Available data centres with their specs. DATA_CENTRE_COLUMNS already
+            # selects exactly the context fields, so the rows are used as-is
+            # (read-only: they are shared with the fetch cache).
+            "data_centres": data_centres,
 
             # Current generation mix (fuel types)
             "generation_mix": generation_mix,
@@ -779,47 +1896,46 @@ class TriggerQueueMonitor:
         }
 
         # Calculate summary metrics
-        if grid_signals:
-            latest = grid_signals[0]
-            context["summary"]["current_national_carbon"] = latest.get("carbon_intensity_forecast")
-            context["summary"]["current_grid_stress"] = latest.get("grid_stress_score")
-            context["summary"]["current_price_gbp_mwh"] = latest.get("wholesale_price_gbp_mwh")
+        if latest_gs is not None:
+            snapshot["summary"]["current_national_carbon"] = latest_gs.get("carbon_intensity_forecast")
+            snapshot["summary"]["current_grid_stress"] = latest_gs.get("grid_stress_score")
+            snapshot["summary"]["current_price_gbp_mwh"] = latest_gs.get("wholesale_price_gbp_mwh")
 
         # Find lowest carbon region
         if regional_signals:
-            sorted_regions = sorted(
+            lowest = min(
                 regional_signals,
                 key=lambda x: x.get("carbon_intensity_forecast") or 9999
             )
-            if sorted_regions:
-                lowest = sorted_regions[0]
-                region_info = lowest.get("regions", {})
-                context["summary"]["lowest_carbon_region"] = {
-                    "name": region_info.get("short_name"),
-                    "carbon_intensity": lowest.get("carbon_intensity_forecast")
-                }
+            region_info = lowest.get("regions") or {}
+            snapshot["summary"]["lowest_carbon_region"] = {
+                "name": region_info.get("short_name"),
+                "carbon_intensity": lowest.get("carbon_intensity_forecast")
+            }
 
-        # Find lowest carbon DC
-        if data_centres:
-            sorted_dcs = sorted(
-                data_centres,
-                key=lambda x: x.get("current_carbon_intensity") or 9999
-            )
-            if sorted_dcs:
-                lowest_dc = sorted_dcs[0]
-                context["summary"]["lowest_carbon_dc"] = {
-                    "name": lowest_dc.get("name"),
-                    "dc_id": lowest_dc.get("dc_id"),
-                    "carbon_intensity": lowest_dc.get("current_carbon_intensity"),
-                    "region": lowest_dc.get("location_region")
-                }
+        if lowest_dc is not None:
+            snapshot["summary"]["lowest_carbon_dc"] = {
+                "name": lowest_dc.get("name"),
+                "dc_id": lowest_dc.get("dc_id"),
+                "carbon_intensity": lowest_dc.get("current_carbon_intensity"),
+                "region": lowest_dc.get("location_region")
+            }
 
-        return context
+        return snapshot
 
     def process_notifications(self):
-        """Fetch and process unprocessed notifications"""
+        """
+        Claim up to NOTIFICATION_BATCH_SIZE unprocessed notifications in one
+        query and hand them to the LLM worker, so the poll thread never
+        blocks on Gemini. Returns the number of notifications claimed.
+        """
         global current_decision_context
 
+        # One batch in flight at a time; its rows stay unprocessed in the DB until it finishes
+        if self._batch_future is not None and not self._batch_future.done():
+            logger.debug("Waiting for current batch to be processed...")
+            return 0
+
         try:
             # Check if we're currently processing a task - hold lock during DB query
             # to prevent race conditions
@@ -831,15 +1947,23 @@ class TriggerQueueMonitor:
 
                 # Get unprocessed notifications ordered by creation time
                 # Do this INSIDE the lock to prevent race conditions
+                claimed_at = time.monotonic()
                 result = self.client.table("workload_notifications") \
                     .select("*") \
                     .eq("processed", False) \
                     .order("created_at", desc=False) \
-                    .limit(1) \
+                    .limit(NOTIFICATION_BATCH_SIZE) \
                     .execute()
 
                 notifications = result.data or []
 
+                # A short batch is every unprocessed row, which is an exact count for free;
+                # a full batch says nothing about the rows behind it, so recount on next read
+                if len(notifications) < NOTIFICATION_BATCH_SIZE:
+                    self.set_unprocessed_count(len(notifications))
+                else:
+                    self.set_unprocessed_count(None)
+
                 if not notifications:
                     # Check if there are pending tasks in the queue
                     if not pending_tasks_queue.empty():
@@ -853,157 +1977,311 @@ class TriggerQueueMonitor:
                 if not notifications:
                     return 0
 
-                # Get the first notification and immediately set current_decision_context
-                # to a placeholder to prevent other polls from picking it up
-                notification = notifications[0]
-                job_id = notification.get('job_id')
+                # Immediately set current_decision_context to a placeholder
+                # to prevent other polls from picking up the batch
+                current_decision_context = {"_placeholder": True, "job_id": notifications[0].get("job_id"), "processed": False}
 
-                # Set a placeholder to block other poll cycles
-                current_decision_context = {"_placeholder": True, "job_id": job_id, "processed": False}
+            self._batch_future = self.llm_pool.submit(self.process_batch, notifications, claimed_at)
+            return len(notifications)
 
-            # Now process outside the lock (but we've claimed this task)
-            logger.info(f"Processing notification for job: {job_id}")
-
-            # Extract workload payload
-            payload = notification.get("payload", {})
+        except Exception as e:
+            logger.error(f"Error processing notifications: {e}")
+            return 0
 
-            # Update agent state to ACTIVE (processing)
-            update_agent_state(
-                self.client,
-                status="ACTIVE",
-                state_data={"current_job_id": job_id, "stage": "building_context"},
-                triggered_by=f"workload_notification:{job_id}"
-            )
+    def process_batch(self, notifications: list, claimed_at: float) -> int:
+        """
+        Process claimed notifications (runs on the LLM worker): build every
+        decision context, run them through Gemini together with
+        process_many_with_llm, then finish each job in order. Each
+        notification is marked processed as soon as its job finishes or
+        fails, so a crash mid-batch does not re-run finished jobs and a
+        failing job cannot hold up the queue.
+        """
+        global current_decision_context
 
-            # Create decision context with all relevant data
+        processed = 0
+        try:
+            prepared = []
+            for notification in notifications:
+                try:
+                    prepared.append((notification, self.build_notification_context(notification)))
+                except Exception as e:
+                    self.record_notification_failure(notification, e)
+                    self.mark_notification_processed(notification, claimed_at)
+                    processed += 1
+
+            llm_outputs = []
+            if prepared:
+                bg_agent_state["status"] = "EXECUTING"
+                try:
+                    # Cache hits and tasks sharing a grid/DC snapshot cost one Gemini call between them
+                    llm_outputs = process_many_with_llm([context for _, context in prepared])
+                except Exception as e:
+                    logger.error(f"Batch LLM processing failed: {e}")
+                    llm_outputs = [None] * len(prepared)
+
+            for (notification, decision_context), llm_output in zip(prepared, llm_outputs):
+                try:
+                    self.complete_notification(notification, decision_context, llm_output)
+                except Exception as e:
+                    self.record_notification_failure(notification, e)
+                self.mark_notification_processed(notification, claimed_at)
+                processed += 1
+
+        finally:
+            # Release the claim so the next poll can pick up the rest of the queue
             with decision_context_lock:
-                current_decision_context = self.create_decision_context(payload)
+                if current_decision_context is not None and not current_decision_context.get("processed", False):
+                    current_decision_context["processed"] = True
+                    current_decision_context["processed_at"] = _iso_now()
+            logger.info(f"Processed {processed} new workload(s)")
+
+        return processed
+
+    def record_notification_failure(self, notification: dict, error: Exception):
+        """Record a job that raised while being processed (LLM_PROCESSING_FAILED unless already decided)"""
+        job_id = notification.get("job_id")
+        logger.error(f"Error processing notification for job {job_id}: {error}")
+        bg_agent_state["status"] = "IDLE"
+        bg_agent_state["last_error"] = f"Processing failed for {job_id}: {error}"
+
+        # A processed context means its decision was already logged before the error
+        context = current_decision_context
+        if context is not None and context.get("processed", False):
+            return
+        log_orchestration_decision(
+            client=self.client,
+            decision_type="LLM_PROCESSING_FAILED",
+            workload_job_id=job_id,
+            reasoning=f"Processing failed before a decision was made: {error}",
+            decision_context=None if context is None or context.get("_placeholder") else context
+        )
 
-            # Print the decision context
-            print("\n" + "=" * 80)
-            print("NEW DECISION CONTEXT CREATED")
-            print("=" * 80)
-            print(json.dumps(current_decision_context, indent=2, default=str))
-            print("=" * 80 + "\n")
+    def mark_notification_processed(self, notification: dict, claimed_at: float):
+        """Mark one notification claimed at claimed_at (monotonic) processed in the database"""
+        notification_id = notification.get("id")
+        if notification_id is None:
+            return
+        try:
+            self.client.table("workload_notifications") \
+                .update({"processed": True}) \
+                .eq("id", notification_id) \
+                .execute()
+            self.adjust_unprocessed_count(-1, claimed_at)
+        except Exception as e:
+            logger.error(f"Error marking notification {notification_id} processed: {e}")
 
-            logger.info(f"Decision context created for job: {payload.get('job_id')}")
-            logger.info(f"  - Task urgency: {payload.get('urgency')}")
-            logger.info(f"  - Carbon cap: {payload.get('carbon_cap_gco2')} gCO2")
-            logger.info(f"  - Available DCs: {current_decision_context['summary']['available_dc_count']}")
+    def set_unprocessed_count(self, count: int):
+        """Record an exact unprocessed notification count (None marks it unknown)"""
+        with self._unprocessed_lock:
+            self._unprocessed = (count, time.monotonic())
 
-            # Update agent state to EXECUTING (calling LLM)
-            update_agent_state(
-                self.client,
-                status="EXECUTING",
-                state_data={"current_job_id": job_id, "stage": "calling_llm"},
-                triggered_by="llm_processing_start"
-            )
+    def adjust_unprocessed_count(self, delta: int, since: float):
+        """
+        Apply a local change to the unprocessed count, only if it has been
+        exact since the monotonic time since (an older count never saw the
+        rows being changed, so adjusting it would drift).
+        """
+        with self._unprocessed_lock:
+            count, known_at = self._unprocessed
+            if count is not None and known_at >= since:
+                self._unprocessed = (max(0, count + delta), known_at)
 
-            # Process with Gemini LLM
-            llm_output = process_with_llm(current_decision_context)
-
-            if llm_output:
-                # Store LLM output for BPP
-                store_llm_output(llm_output)
-
-                # Print LLM output
-                print("\n" + "=" * 80)
-                print("GEMINI LLM OUTPUT")
-                print("=" * 80)
-                print(json.dumps(llm_output, indent=2, default=str))
-                print("=" * 80 + "\n")
-
-                # Find recommended DC (highest suitability score)
-                recommended_dc = None
-                dc_options = llm_output.get("data_centre_options", [])
-                if dc_options:
-                    available_dcs = [dc for dc in dc_options if dc.get("compute_profile", {}).get("available_for_task", False)]
-                    if available_dcs:
-                        recommended_dc = max(available_dcs, key=lambda x: x.get("suitability_score", 0))
-                    elif dc_options:
-                        recommended_dc = max(dc_options, key=lambda x: x.get("suitability_score", 0))
-
-                # Log orchestration decision (success)
-                log_orchestration_decision(
-                    client=self.client,
-                    decision_type="LLM_DC_SELECTION",
-                    workload_job_id=job_id,
-                    reasoning=json.dumps(llm_output, default=str),
-                    llm_output=llm_output,
-                    decision_context=current_decision_context,
-                    recommended_dc=recommended_dc
-                )
-
-                # Add to broadcast queue
-                broadcast_msg = {
-                    "context": create_beckn_context(action="llm_output"),
-                    "type": "llm_processed",
-                    "llm_output": llm_output
-                }
-                broadcast_queue.put(broadcast_msg)
+    def unprocessed_count(self) -> int:
+        """
+        Unprocessed notification count, kept locally from the claim queries and
+        completed batches; the DB is re-counted once the value is older than
+        UNPROCESSED_COUNT_TTL (the trigger inserts rows the monitor never sees).
+        """
+        count, known_at = self._unprocessed
+        if count is None or time.monotonic() - known_at > UNPROCESSED_COUNT_TTL:
+            count = count_unprocessed_notifications(self.client)
+            self.set_unprocessed_count(count)
+        return count
+
+    def build_notification_context(self, notification: dict) -> dict:
+        """Build the decision context for one notification's workload"""
+        job_id = notification.get('job_id')
+        logger.info(f"Processing notification for job: {job_id}")
+
+        # Extract workload payload
+        payload = notification.get("payload", {})
+
+        # Intermediate stages are tracked in memory only (visible via /beckn/agent);
+        # Supabase gets a single state write once the workload is done
+        bg_agent_state["status"] = "ACTIVE"
+
+        # Create decision context with all relevant data. The claim placeholder
+        # keeps other polls off the batch, so no lock is needed while building.
+        decision_context = self.create_decision_context(payload)
+
+        # Dump the full decision context only when debugging - pretty-printing it is costly
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("New decision context created:\n%s", dumps_json(decision_context, indent=True))
+
+        logger.info(f"Decision context created for job: {payload.get('job_id')}")
+        logger.info(f"  - Task urgency: {payload.get('urgency')}")
+        logger.info(f"  - Carbon cap: {payload.get('carbon_cap_gco2')} gCO2")
+        logger.info(f"  - Available DCs: {decision_context['summary']['available_dc_count']}")
+        return decision_context
+
+    def complete_notification(self, notification: dict, decision_context: dict, llm_output: dict):
+        """Publish one job's LLM output, log its decision and broadcast the workload"""
+        global current_decision_context
 
-                logger.info("LLM output broadcasted successfully")
-                bg_agent_state["tasks_processed"] += 1
-            else:
-                logger.error("Failed to process with LLM - no output generated")
-                bg_agent_state["last_error"] = f"LLM processing failed for {job_id}"
-
-                # Log orchestration decision (failure)
-                log_orchestration_decision(
-                    client=self.client,
-                    decision_type="LLM_PROCESSING_FAILED",
-                    workload_job_id=job_id,
-                    reasoning=f"LLM processing failed after {LLM_MAX_RETRIES + 1} attempts. No valid output generated.",
-                    decision_context=current_decision_context
-                )
-
-            # Mark decision context as processed
-            with decision_context_lock:
-                current_decision_context["processed"] = True
-                current_decision_context["processed_at"] = datetime.now(timezone.utc).isoformat()
+        job_id = notification.get('job_id')
+        payload = notification.get("payload", {})
+        stages = ["building_context", "calling_llm"]
 
-            # Create Beckn broadcast message for workload
-            broadcast_msg = create_broadcast_message(payload)
-            broadcast_queue.put(broadcast_msg)
+        with decision_context_lock:
+            current_decision_context = decision_context
 
-            # Add to catalog
-            catalog_items.append(workload_to_beckn_item(payload))
+        if llm_output:
+            # Store LLM output for BPP
+            store_llm_output(llm_output)
 
-            # Mark notification as processed in database
-            self.client.table("workload_notifications") \
-                .update({"processed": True}) \
-                .eq("id", notification["id"]) \
-                .execute()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Gemini LLM output:\n%s", dumps_json(llm_output, indent=True))
 
-            # Update agent state back to IDLE
-            update_agent_state(
-                self.client,
-                status="IDLE",
-                state_data={"last_job_id": job_id, "tasks_processed": bg_agent_state["tasks_processed"]},
-                triggered_by=f"task_completed:{job_id}"
+            # Recommended DC (highest suitability score), precomputed by attach_llm_metadata
+            recommended_dc = llm_output["_metadata"]["recommended_dc"]
+
+            # Log orchestration decision (success)
+            log_orchestration_decision(
+                client=self.client,
+                decision_type="LLM_DC_SELECTION",
+                workload_job_id=job_id,
+                reasoning=dumps_json(llm_output),
+                llm_output=llm_output,
+                decision_context=current_decision_context,
+                recommended_dc=recommended_dc
             )
 
-            logger.info(f"Workload {job_id} fully processed")
+            # Add to broadcast queue
+            broadcast_msg = {
+                "context": create_beckn_context(action="llm_output"),
+                "type": "llm_processed",
+                "llm_output": llm_output
+            }
+            publish_broadcast(broadcast_msg)
 
-            return 1
+            logger.info("LLM output broadcasted successfully")
+            bg_agent_state["tasks_processed"] += 1
+        else:
+            logger.error("Failed to process with LLM - no output generated")
+            bg_agent_state["last_error"] = f"LLM processing failed for {job_id}"
+
+            # Log orchestration decision (failure)
+            log_orchestration_decision(
+                client=self.client,
+                decision_type="LLM_PROCESSING_FAILED",
+                workload_job_id=job_id,
+                reasoning=f"LLM processing failed after {LLM_MAX_RETRIES + 1} attempts. No valid output generated.",
+                decision_context=current_decision_context
+            )
 
+        # Mark decision context as processed
+        with decision_context_lock:
+            current_decision_context["processed"] = True
+            current_decision_context["processed_at"] = _iso_now()
+
+        # Create Beckn broadcast message for workload
+        publish_broadcast(create_broadcast_message(payload))
+
+        # Add to catalog
+        add_catalog_item(workload_to_beckn_item(payload))
+
+        # Update agent state back to IDLE, recording the stages this workload went through
+        stages.append("done")
+        update_agent_state(
+            self.client,
+            status="IDLE",
+            state_data={"last_job_id": job_id, "stages": stages, "tasks_processed": bg_agent_state["tasks_processed"]},
+            triggered_by=f"task_completed:{job_id}"
+        )
+
+        logger.info(f"Workload {job_id} fully processed")
+
+    def next_poll_interval(self, count: int) -> float:
+        """
+        Adapt the poll interval to queue activity: poll quickly after a
+        workload arrives, back off exponentially while the queue is idle.
+        """
+        if count > 0:
+            self._idle_cycles = 0
+            return POLL_INTERVAL_MIN
+
+        with decision_context_lock:
+            waiting = current_decision_context is not None and not current_decision_context.get("processed", False)
+        if waiting or (self._batch_future is not None and not self._batch_future.done()):
+            # Blocked on BPP, not idle - keep the base interval so the next task starts promptly
+            return POLL_INTERVAL
+
+        interval = min(POLL_INTERVAL_MAX, POLL_INTERVAL * POLL_BACKOFF ** self._idle_cycles)
+        self._idle_cycles += 1
+        return interval
+
+    def open_listener(self):
+        """
+        LISTEN on WORKLOAD_NOTIFY_CHANNEL over a direct Postgres connection so
+        the poll loop wakes as soon as the trigger fires. Needs psycopg and
+        SUPABASE_DB_URL; without them the loop just polls.
+        """
+        if psycopg is None or not SUPABASE_DB_URL:
+            logger.info("LISTEN/NOTIFY disabled (needs psycopg and SUPABASE_DB_URL) - polling only")
+            return
+
+        try:
+            self._listen_conn = psycopg.connect(SUPABASE_DB_URL, autocommit=True)
+            self._listen_conn.execute(f"LISTEN {WORKLOAD_NOTIFY_CHANNEL}")
+            logger.info(f"Listening for {WORKLOAD_NOTIFY_CHANNEL} notifications")
         except Exception as e:
-            logger.error(f"Error processing notifications: {e}")
-            return 0
+            logger.warning(f"Could not LISTEN for workload notifications, polling only: {e}")
+            self._listen_conn = None
+
+    def close_listener(self):
+        """Close the LISTEN connection, if any"""
+        if self._listen_conn is not None:
+            try:
+                self._listen_conn.close()
+            except Exception:
+                pass
+            self._listen_conn = None
+
+    def wait_for_work(self, timeout: float):
+        """
+        Block until a workload notification arrives or timeout elapses. The
+        timeout doubles as the safety-net poll if a notification is missed.
+        """
+        if self._listen_conn is None:
+            time.sleep(timeout)
+            return
+
+        try:
+            for _ in self._listen_conn.notifies(timeout=timeout, stop_after=1):
+                pass
+        except Exception as e:
+            logger.warning(f"LISTEN connection lost, falling back to polling: {e}")
+            self.close_listener()
+            time.sleep(timeout)
 
     def poll_loop(self):
         """Main polling loop"""
         logger.info("Starting trigger queue monitor...")
+        self.open_listener()
 
         while self.running:
+            count = 0
             try:
                 count = self.process_notifications()
                 if count > 0:
-                    logger.info(f"Processed {count} new workload(s)")
+                    logger.info(f"Claimed {count} new workload(s)")
             except Exception as e:
                 logger.error(f"Poll loop error: {e}")
 
-            time.sleep(POLL_INTERVAL)
+            self.wait_for_work(self.next_poll_interval(count))
+
+        self.close_listener()
 
     def start(self):
         """Start the monitor in a background thread"""
@@ -1017,6 +2295,9 @@ class TriggerQueueMonitor:
         self.running = False
         if self.thread:
             self.thread.join(timeout=5)
+        self.llm_pool.shutdown(wait=False)
+        self.executor.shutdown(wait=False)
+        self.http_client.close()
         logger.info("Trigger queue monitor stopped")
 
 
@@ -1032,7 +2313,7 @@ def init_monitor():
         logger.error("Supabase credentials not found")
         return False
 
-    if not GEMINI_API_KEY:
+    if not LLM_ENABLED:
         logger.warning("GEMINI_API_KEY not configured - LLM processing disabled")
 
     try:
@@ -1068,64 +2349,159 @@ def mark_current_task_processed():
     with decision_context_lock:
         if current_decision_context:
             current_decision_context["processed"] = True
-            current_decision_context["processed_at"] = datetime.now(timezone.utc).isoformat()
+            current_decision_context["processed_at"] = _iso_now()
             logger.info(f"Task {current_decision_context['task']['job_id']} marked as processed")
             return True
     return False
 
 
+# bg_unprocessed_count / bg_mark_all_processed RPCs
+# (migration_add_bg_notification_rpcs.sql); disabled if the functions are not installed
+notification_rpc_available = True
+
+
+def count_unprocessed_notifications(client: Client) -> int:
+    """Number of workload notifications not yet processed"""
+    global notification_rpc_available
+
+    if notification_rpc_available:
+        try:
+            return client.rpc("bg_unprocessed_count").execute().data or 0
+        except Exception as e:
+            if is_missing_function_error(e):
+                notification_rpc_available = False
+                logger.warning(f"bg_unprocessed_count RPC unavailable, using count query: {e}")
+            else:
+                logger.warning(f"bg_unprocessed_count RPC failed, using count query for this call: {e}")
+
+    count_result = client.table("workload_notifications") \
+        .select("id", count="exact") \
+        .eq("processed", False) \
+        .execute()
+    return count_result.count or 0
+
+
+def mark_all_notifications_processed(client: Client) -> int:
+    """Mark every unprocessed workload notification processed; returns how many"""
+    global notification_rpc_available
+
+    if notification_rpc_available:
+        try:
+            return client.rpc("bg_mark_all_processed").execute().data or 0
+        except Exception as e:
+            if is_missing_function_error(e):
+                notification_rpc_available = False
+                logger.warning(f"bg_mark_all_processed RPC unavailable, using count + update: {e}")
+            else:
+                logger.warning(f"bg_mark_all_processed RPC failed, using count + update for this call: {e}")
+
+    count = count_unprocessed_notifications(client)
+    if count > 0:
+        client.table("workload_notifications") \
+            .update({"processed": True}) \
+            .eq("processed", False) \
+            .execute()
+    return count
+
+
+# Database side of /beckn/reset, run off the request thread
+RESET_JOBS_KEPT = 32  # most recent reset results kept for /beckn/reset/status
+reset_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bg-reset")
+reset_jobs = OrderedDict()  # reset_token -> Future[int]
+reset_jobs_lock = Lock()
+
+
+def clear_db_notifications(queue_monitor: "TriggerQueueMonitor") -> int:
+    """Mark every unprocessed notification processed for /beckn/reset"""
+    try:
+        db_cleared = mark_all_notifications_processed(queue_monitor.client)
+    except Exception as e:
+        logger.warning(f"Could not clear database notifications: {e}")
+        raise
+
+    queue_monitor.set_unprocessed_count(0)
+    logger.info(f"BG reset marked {db_cleared} database notification(s) processed")
+    return db_cleared
+
+
 def get_current_decision_context() -> dict:
-    """Get the current decision context (thread-safe)"""
-    with decision_context_lock:
-        return current_decision_context
+    """Get the current decision context (lock-free reference snapshot)"""
+    return current_decision_context
 
 
 # =============================================================================
 # FLASK API ENDPOINTS
 # =============================================================================
 
+# Constant parts of the / and /beckn/agent responses, built once at import
+HOME_STATIC = {
+    "service": "Beckn Gateway (BG)",
+    "domain": DOMAIN,
+    "version": "1.0.0",
+    "endpoints": {
+        "/beckn/catalog": "GET - Current catalog of workloads",
+        "/beckn/broadcast": "GET - Stream new workloads (SSE)",
+        "/beckn/broadcast/poll": "GET - Poll for new workloads",
+        "/beckn/context": "GET - Current decision context",
+        "/beckn/context/processed": "POST - Mark current task as processed",
+        "/beckn/llm-output": "GET - Oldest unacknowledged LLM output (BPP monitors this)",
+        "/beckn/llm-output/history": "GET - LLM output history",
+        "/beckn/llm-output/history/stream": "GET - LLM output history (NDJSON stream)",
+        "/beckn/agent": "GET - Agent status and info",
+        "/health": "GET - Health check"
+    }
+}
+AGENT_IDENTITY = {
+    "agent_id": BG_AGENT_ID,
+    "agent_name": BG_AGENT_NAME,
+    "agent_type": BG_AGENT_TYPE
+}
+AGENT_CONFIG = {
+    "llm_model": GEMINI_MODEL,
+    "poll_interval_seconds": POLL_INTERVAL,
+    "port": BG_PORT,
+    "beckn_domain": DOMAIN
+}
+
+
+# HOME_STATIC encoded once, without its closing brace, so home() only encodes the live fields
+HOME_BODY_HEAD = dumps_json_bytes(HOME_STATIC)[:-1]
+
+
 @app.route("/")
 def home():
     """Service info"""
-    return jsonify({
-        "service": "Beckn Gateway (BG)",
-        "domain": DOMAIN,
-        "version": "1.0.0",
-        "endpoints": {
-            "/beckn/catalog": "GET - Current catalog of workloads",
-            "/beckn/broadcast": "GET - Stream new workloads (SSE)",
-            "/beckn/broadcast/poll": "GET - Poll for new workloads",
-            "/beckn/context": "GET - Current decision context",
-            "/beckn/context/processed": "POST - Mark current task as processed",
-            "/beckn/llm-output": "GET - Latest LLM output (BPP monitors this)",
-            "/beckn/llm-output/history": "GET - LLM output history",
-            "/beckn/agent": "GET - Agent status and info",
-            "/health": "GET - Health check"
-        },
-        "monitor_status": "running" if (monitor and monitor.running) else "stopped",
-        "llm_enabled": bool(GEMINI_API_KEY),
+    queue_monitor = monitor
+    live = dumps_json_bytes({
+        "monitor_status": "running" if (queue_monitor and queue_monitor.running) else "stopped",
+        "llm_enabled": LLM_ENABLED,
         "agent": {
             "agent_id": BG_AGENT_ID,
             "status": bg_agent_state["status"],
             "registered": bg_agent_state["agent_uuid"] is not None
         }
     })
+    return Response(HOME_BODY_HEAD + b"," + live[1:], mimetype="application/json")
 
 
 @app.route("/health")
 def health():
     """Health check endpoint"""
+    # Probes take no locks: the context and LLM output are reference snapshots
+    # and the queue sizes are read straight off their deques (qsize() would
+    # take each queue's mutex)
     ctx = get_current_decision_context()
-    with llm_output_store["lock"]:
-        latest_llm = llm_output_store["latest"]
+    pending_llm, _ = llm_output_state
+    latest_llm = pending_llm[0] if pending_llm else None
+    queue_monitor = monitor
 
     return jsonify({
         "status": "healthy",
-        "monitor_running": monitor.running if monitor else False,
-        "llm_enabled": bool(GEMINI_API_KEY),
+        "monitor_running": queue_monitor.running if queue_monitor else False,
+        "llm_enabled": LLM_ENABLED,
         "catalog_size": len(catalog_items),
-        "queue_size": broadcast_queue.qsize(),
-        "pending_tasks": pending_tasks_queue.qsize(),
+        "queue_size": len(broadcast_queue.queue),
+        "pending_tasks": len(pending_tasks_queue.queue),
         "agent": {
             "agent_id": BG_AGENT_ID,
             "agent_uuid": bg_agent_state["agent_uuid"],
@@ -1133,13 +2509,18 @@ def health():
             "tasks_processed": bg_agent_state["tasks_processed"],
             "last_error": bg_agent_state["last_error"]
         },
+        "llm": {
+            "rate_limited_ratio": round(gemini_error_rate(), 3),
+            "ewma_latency_seconds": round(gemini_stats["ewma_latency"], 3)
+        },
         "current_task": {
-            "job_id": ctx["task"]["job_id"] if ctx else None,
-            "processed": ctx["processed"] if ctx else None
+            # Placeholders set while a context is being built carry job_id at the top level
+            "job_id": ctx["task"]["job_id"] if "task" in ctx else ctx.get("job_id"),
+            "processed": ctx["processed"]
         } if ctx else None,
         "latest_llm_output": {
-            "task_id": latest_llm.get("_metadata", {}).get("task_id") if latest_llm else None,
-            "generated_at": latest_llm.get("_metadata", {}).get("generated_at") if latest_llm else None
+            "task_id": llm_output_meta(latest_llm, "task_id"),
+            "generated_at": llm_output_meta(latest_llm, "generated_at")
         }
     })
 
@@ -1148,19 +2529,12 @@ def health():
 def get_agent_info():
     """Get detailed agent information"""
     return jsonify({
-        "agent_id": BG_AGENT_ID,
-        "agent_name": BG_AGENT_NAME,
-        "agent_type": BG_AGENT_TYPE,
+        **AGENT_IDENTITY,
         "agent_uuid": bg_agent_state["agent_uuid"],
         "status": bg_agent_state["status"],
         "tasks_processed": bg_agent_state["tasks_processed"],
         "last_error": bg_agent_state["last_error"],
-        "config": {
-            "llm_model": GEMINI_MODEL,
-            "poll_interval_seconds": POLL_INTERVAL,
-            "port": BG_PORT,
-            "beckn_domain": DOMAIN
-        }
+        "config": AGENT_CONFIG
     })
 
 
@@ -1185,16 +2559,16 @@ def mark_processed():
 @app.route("/beckn/llm-output", methods=["GET"])
 def get_llm_output():
     """
-    Get the latest LLM output.
+    Get the oldest LLM output BPP has not acknowledged yet.
     BPP monitors this endpoint for new processed tasks.
     """
-    with llm_output_store["lock"]:
-        latest = llm_output_store["latest"]
+    pending, _ = llm_output_state
 
-    if latest:
+    if pending:
         return jsonify({
             "status": "success",
-            "output": latest
+            "output": pending[0],
+            "pending_count": len(pending)
         })
     return jsonify({
         "status": "empty",
@@ -1206,8 +2580,7 @@ def get_llm_output():
 @app.route("/beckn/llm-output/history", methods=["GET"])
 def get_llm_output_history():
     """Get LLM output history"""
-    with llm_output_store["lock"]:
-        history = llm_output_store["history"].copy()
+    _, history = llm_output_state
 
     return jsonify({
         "status": "success",
@@ -1216,17 +2589,30 @@ def get_llm_output_history():
     })
 
 
+@app.route("/beckn/llm-output/history/stream", methods=["GET"])
+def stream_llm_output_history():
+    """Stream LLM output history as NDJSON, one output encoded per line"""
+    _, history = llm_output_state
+
+    def generate():
+        for output in history:
+            yield dumps_json_bytes(output) + b"\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
 @app.route("/beckn/llm-output/clear", methods=["POST"])
 def clear_llm_output():
     """
-    Clear the latest LLM output after BPP has processed it.
-    This prevents BPP from reprocessing the same task.
+    Clear the LLM output currently served by /beckn/llm-output after BPP has
+    processed it. This prevents BPP from reprocessing the same task.
     """
-    with llm_output_store["lock"]:
-        task_id = None
-        if llm_output_store["latest"]:
-            task_id = llm_output_store["latest"].get("_metadata", {}).get("task_id")
-        llm_output_store["latest"] = None
+    global llm_output_state
+
+    with llm_output_lock:
+        pending, history = llm_output_state
+        task_id = llm_output_meta(pending[0], "task_id") if pending else None
+        llm_output_state = (pending[1:], history)
 
     if task_id:
         logger.info(f"Cleared LLM output for task: {task_id}")
@@ -1245,7 +2631,8 @@ def clear_llm_output():
 def acknowledge_llm_output():
     """
     Acknowledge that a specific task has been processed by BPP.
-    Clears the latest output only if it matches the acknowledged task_id.
+    Removes that task's output from the unacknowledged queue, so
+    /beckn/llm-output moves on to the next one.
     """
     data = request.get_json() or {}
     task_id = data.get("task_id")
@@ -1253,13 +2640,14 @@ def acknowledge_llm_output():
     if not task_id:
         return jsonify({"status": "error", "message": "task_id is required"}), 400
 
-    with llm_output_store["lock"]:
-        current_task_id = None
-        if llm_output_store["latest"]:
-            current_task_id = llm_output_store["latest"].get("_metadata", {}).get("task_id")
+    global llm_output_state
+
+    with llm_output_lock:
+        pending, history = llm_output_state
+        remaining = tuple(output for output in pending if llm_output_meta(output, "task_id") != task_id)
 
-        if current_task_id == task_id:
-            llm_output_store["latest"] = None
+        if len(remaining) < len(pending):
+            llm_output_state = (remaining, history)
             logger.info(f"Acknowledged and cleared LLM output for task: {task_id}")
             return jsonify({
                 "status": "success",
@@ -1286,29 +2674,26 @@ def get_bg_status():
         "current_decision_context": None,
         "pending_tasks_queue_size": pending_tasks_queue.qsize(),
         "broadcast_queue_size": broadcast_queue.qsize(),
-        "llm_output_available": llm_output_store["latest"] is not None,
-        "llm_history_count": len(llm_output_store["history"]),
+        "llm_output_available": bool(llm_output_state[0]),
+        "llm_outputs_pending": len(llm_output_state[0]),
+        "llm_history_count": len(llm_output_state[1]),
         "unprocessed_notifications": 0,
         "database_connected": False
     }
 
     # Get current decision context info
-    with decision_context_lock:
-        if current_decision_context:
-            status["current_decision_context"] = {
-                "job_id": current_decision_context.get("task", {}).get("job_id") or current_decision_context.get("job_id"),
-                "processed": current_decision_context.get("processed", False)
-            }
+    ctx = get_current_decision_context()
+    if ctx:
+        status["current_decision_context"] = {
+            "job_id": ctx.get("task", {}).get("job_id") or ctx.get("job_id"),
+            "processed": ctx.get("processed", False)
+        }
 
     # Check database for unprocessed notifications
     if monitor and monitor.client:
         status["database_connected"] = True
         try:
-            count_result = monitor.client.table("workload_notifications") \
-                .select("id", count="exact") \
-                .eq("processed", False) \
-                .execute()
-            status["unprocessed_notifications"] = count_result.count or 0
+            status["unprocessed_notifications"] = monitor.unprocessed_count()
         except Exception as e:
             status["database_error"] = str(e)
 
@@ -1322,36 +2707,23 @@ def reset_bg_state():
     marks all unprocessed notifications as processed in database.
     Use this to start fresh without pending tasks from previous runs.
     """
-    global current_decision_context
+    global current_decision_context, llm_output_state
 
     cleared_items = []
 
     # Clear LLM output store
-    with llm_output_store["lock"]:
-        if llm_output_store["latest"]:
-            cleared_items.append("llm_output")
-        llm_output_store["latest"] = None
-        llm_output_store["history"].clear()
+    with llm_output_lock:
+        if llm_output_state[0]:
+            cleared_items.append(f"llm_output ({len(llm_output_state[0])})")
+        llm_output_state = ((), ())
 
     # Clear pending tasks queue
-    pending_cleared = 0
-    while not pending_tasks_queue.empty():
-        try:
-            pending_tasks_queue.get_nowait()
-            pending_cleared += 1
-        except Empty:
-            break
+    pending_cleared = len(drain_queue(pending_tasks_queue))
     if pending_cleared > 0:
         cleared_items.append(f"pending_tasks_queue ({pending_cleared})")
 
     # Clear broadcast queue
-    broadcast_cleared = 0
-    while not broadcast_queue.empty():
-        try:
-            broadcast_queue.get_nowait()
-            broadcast_cleared += 1
-        except Empty:
-            break
+    broadcast_cleared = len(drain_queue(broadcast_queue))
     if broadcast_cleared > 0:
         cleared_items.append(f"broadcast_queue ({broadcast_cleared})")
 
@@ -1360,60 +2732,113 @@ def reset_bg_state():
         current_decision_context = None
     cleared_items.append("decision_context")
 
-    # Optionally mark all unprocessed notifications as processed in database
-    db_cleared = 0
-    if monitor and monitor.client:
-        try:
-            # Get count of unprocessed
-            count_result = monitor.client.table("workload_notifications") \
-                .select("id", count="exact") \
-                .eq("processed", False) \
-                .execute()
+    logger.info(f"BG state reset - cleared: {cleared_items}")
 
-            if count_result.count and count_result.count > 0:
-                # Mark all as processed
-                monitor.client.table("workload_notifications") \
-                    .update({"processed": True}) \
-                    .eq("processed", False) \
-                    .execute()
-                db_cleared = count_result.count
-                cleared_items.append(f"db_notifications ({db_cleared})")
-        except Exception as e:
-            logger.warning(f"Could not clear database notifications: {e}")
+    # Mark all unprocessed notifications as processed in the database off the
+    # request thread; callers can poll /beckn/reset/status with the token
+    if monitor and monitor.client:
+        reset_token = str(uuid.uuid4())
+        future = reset_pool.submit(clear_db_notifications, monitor)
+        with reset_jobs_lock:
+            reset_jobs[reset_token] = future
+            while len(reset_jobs) > RESET_JOBS_KEPT:
+                reset_jobs.popitem(last=False)
 
-    logger.info(f"BG state reset - cleared: {cleared_items}")
+        return jsonify({
+            "status": "accepted",
+            "message": "BG state reset; database notifications are being cleared",
+            "cleared": cleared_items,
+            "reset_token": reset_token
+        }), 202
 
     return jsonify({
         "status": "success",
         "message": "BG state reset successfully",
         "cleared": cleared_items,
-        "db_notifications_cleared": db_cleared
+        "db_notifications_cleared": 0
     })
 
 
-@app.route("/beckn/catalog", methods=["GET"])
-def get_catalog():
-    """Get the current catalog of all available workloads."""
-    return jsonify({
-        "context": create_beckn_context(action="on_search"),
-        "message": {
-            "catalog": {
+@app.route("/beckn/reset/status", methods=["GET"])
+def get_reset_status():
+    """Result of the database part of a /beckn/reset, by reset_token"""
+    with reset_jobs_lock:
+        future = reset_jobs.get(request.args.get("token"))
+
+    if future is None:
+        return jsonify({"status": "error", "message": "Unknown reset token"}), 404
+    if not future.done():
+        return jsonify({"status": "pending"})
+    if future.exception() is not None:
+        return jsonify({"status": "error", "message": str(future.exception())})
+    return jsonify({"status": "success", "db_notifications_cleared": future.result()})
+
+
+# Encoded catalog message around its items array, split once at import
+CATALOG_STREAM_CHUNK = 64  # catalog items encoded per streamed chunk
+CATALOG_MESSAGE_HEAD, CATALOG_MESSAGE_TAIL = dumps_json_bytes({
+    "catalog": {
+        "descriptor": {
+            "name": "DEG Compute Workload Catalog",
+            "short_desc": "All available compute workloads"
+        },
+        "providers": [
+            {
+                "id": "deg-compute-gateway",
                 "descriptor": {
-                    "name": "DEG Compute Workload Catalog",
-                    "short_desc": "All available compute workloads"
+                    "name": "DEG Compute Gateway"
                 },
-                "providers": [
-                    {
-                        "id": "deg-compute-gateway",
-                        "descriptor": {
-                            "name": "DEG Compute Gateway"
-                        },
-                        "items": catalog_items
-                    }
-                ]
+                "items": []
             }
-        }
-    })
+        ]
+    }
+}).split(b"[]")
+
+
+def stream_catalog(context: bytes, version: int, items: list):
+    """
+    Yield the /beckn/catalog body, encoding CATALOG_STREAM_CHUNK items at a
+    time so the first bytes go out before the whole catalog is encoded. The
+    assembled message is cached for later requests at the same version.
+    """
+    global catalog_body
+
+    chunks = [CATALOG_MESSAGE_HEAD, b"["]
+    yield b"".join((b'{"context":', context, b',"message":', CATALOG_MESSAGE_HEAD, b"["))
+    for start in range(0, len(items), CATALOG_STREAM_CHUNK):
+        chunk = b",".join(dumps_json_bytes(item) for item in items[start:start + CATALOG_STREAM_CHUNK])
+        if start:
+            chunk = b"," + chunk
+        chunks.append(chunk)
+        yield chunk
+    chunks.extend((b"]", CATALOG_MESSAGE_TAIL))
+    yield b"]" + CATALOG_MESSAGE_TAIL + b"}"
+
+    catalog_body = (version, b"".join(chunks))
+
+
+@app.route("/beckn/catalog", methods=["GET"])
+def get_catalog():
+    """Get the current catalog of all available workloads."""
+    # The Beckn context (fresh message_id/timestamp) is encoded per request;
+    # the catalog message is served from cache until the catalog changes, and
+    # streamed (then cached) after it has
+    context = dumps_json_bytes(create_beckn_context(action="on_search"))
+
+    version, message = catalog_body
+    if version != catalog_version:
+        return Response(
+            stream_catalog(context, catalog_version, list(catalog_items)),
+            mimetype="application/json"
+        )
+
+    body = b"".join((b'{"context":', context, b',"message":', message, b"}"))
+    return Response(body, mimetype="application/json")
+
+
+# Fixed SSE frames; only the keepalive timestamp varies
+SSE_CONNECTED_FRAME = b'data: {"type":"connected","message":"Connected to DEG Beckn Gateway"}\n\n'
+SSE_KEEPALIVE_TEMPLATE = b'data: {"type":"keepalive","timestamp":"%s"}\n\n'
 
 
 @app.route("/beckn/broadcast", methods=["GET"])
@@ -1423,20 +2848,22 @@ def broadcast_stream():
     BPP connects to this and receives new workloads as they arrive.
     """
     def generate():
+        subscriber = subscribe_sse()
         logger.info("BPP connected to broadcast stream")
 
-        yield f"data: {json.dumps({'type': 'connected', 'message': 'Connected to DEG Beckn Gateway'})}\n\n"
-
-        while True:
-            try:
-                broadcast_msg = broadcast_queue.get(timeout=30)
-                yield f"data: {json.dumps(broadcast_msg, default=str)}\n\n"
-                logger.info(f"Broadcast sent: {broadcast_msg.get('context', {}).get('message_id', 'unknown')}")
-            except Empty:
-                yield f"data: {json.dumps({'type': 'keepalive', 'timestamp': datetime.now(timezone.utc).isoformat()})}\n\n"
-            except GeneratorExit:
-                logger.info("BPP disconnected")
-                break
+        try:
+            yield SSE_CONNECTED_FRAME
+
+            while True:
+                try:
+                    message_id, encoded = subscriber.get(timeout=30)
+                    yield b"data: " + encoded + b"\n\n"
+                    logger.info(f"Broadcast sent: {message_id}")
+                except Empty:
+                    yield SSE_KEEPALIVE_TEMPLATE % _iso_now().encode()
+        finally:
+            unsubscribe_sse(subscriber)
+            logger.info("BPP disconnected")
 
     return Response(
         generate(),
@@ -1452,19 +2879,15 @@ def broadcast_stream():
 @app.route("/beckn/broadcast/poll", methods=["GET"])
 def broadcast_poll():
     """Polling endpoint for BPPs that can't use SSE."""
-    broadcasts = []
-
-    while not broadcast_queue.empty():
-        try:
-            broadcasts.append(broadcast_queue.get_nowait())
-        except Empty:
-            break
-
-    return jsonify({
-        "context": create_beckn_context(action="broadcast"),
-        "broadcasts": broadcasts,
-        "count": len(broadcasts)
-    })
+    broadcasts = drain_queue(broadcast_queue)
+
+    # Broadcasts are queued already encoded, so splice them into the body as-is
+    body = b"".join((
+        b'{"context":', dumps_json_bytes(create_beckn_context(action="broadcast")),
+        b',"broadcasts":[', b",".join(encoded for _, encoded in broadcasts),
+        b'],"count":', str(len(broadcasts)).encode(), b"}"
+    ))
+    return Response(body, mimetype="application/json")
 
 
 @app.route("/beckn/search", methods=["POST"])
@@ -122,7 +122,7 @@ def wait_for_bg_connection() -> bool:
 
 def fetch_llm_output() -> Optional[Dict]:
     """
-    Fetch the latest LLM output from BG's /beckn/llm-output endpoint.
+    Fetch the oldest unacknowledged LLM output from BG's /beckn/llm-output endpoint.
     Returns the output dict or None if not available.
     """
     try:
@@ -139,6 +139,29 @@ def fetch_llm_output() -> Optional[Dict]:
         return None
 
 
+def acknowledge_task(task_id: str):
+    """
+    Acknowledge a processed task to BG, which removes its output from the
+    queue served by /beckn/llm-output so the next output is returned.
+    """
+    try:
+        ack_response = requests.post(
+            f"{BG_BASE_URL}/beckn/llm-output/acknowledge",
+            json={"task_id": task_id},
+            timeout=5
+        )
+        if ack_response.status_code == 200:
+            ack_data = ack_response.json()
+            if ack_data.get("cleared"):
+                logger.info(f"Acknowledged task {task_id} to BG - output cleared")
+            else:
+                logger.debug(f"Acknowledged task {task_id} to BG - no output to clear")
+        else:
+            logger.warning(f"Failed to acknowledge task to BG: {ack_response.status_code}")
+    except Exception as ack_error:
+        logger.warning(f"Could not acknowledge task to BG: {ack_error}")
+
+
 def build_weight_prompt(dc_option: Dict, task: Dict) -> str:
     """
     Build prompt for Gemini to generate weight assignments for a specific DC-task pairing.
@@ -377,8 +400,10 @@ def polling_worker():
                     already_processed = task_id in processed_task_ids
 
                 if already_processed:
-                    # Task already processed, skip
-                    logger.debug(f"Task {task_id} already processed, skipping")
+                    # Task already processed - its acknowledgement must have been lost, and
+                    # BG keeps serving it ahead of the queued outputs until it is acknowledged
+                    logger.debug(f"Task {task_id} already processed, re-acknowledging")
+                    acknowledge_task(task_id)
                     time.sleep(POLL_INTERVAL)
                     continue
 
@@ -414,22 +439,7 @@ def polling_worker():
                         processed_task_ids.add(task_id)
 
                     # Acknowledge to BG that we've processed this task (clears the output)
-                    try:
-                        ack_response = requests.post(
-                            f"{BG_BASE_URL}/beckn/llm-output/acknowledge",
-                            json={"task_id": task_id},
-                            timeout=5
-                        )
-                        if ack_response.status_code == 200:
-                            ack_data = ack_response.json()
-                            if ack_data.get("cleared"):
-                                logger.info(f"Acknowledged task {task_id} to BG - output cleared")
-                            else:
-                                logger.debug(f"Acknowledged task {task_id} to BG - no output to clear")
-                        else:
-                            logger.warning(f"Failed to acknowledge task to BG: {ack_response.status_code}")
-                    except Exception as ack_error:
-                        logger.warning(f"Could not acknowledge task to BG: {ack_error}")
+                    acknowledge_task(task_id)
 
                     # Update tracking
                     last_processed_task_id = task_id
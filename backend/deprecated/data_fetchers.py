@@ -4,11 +4,26 @@ import datetime
 import random
 import logging
 import json
+import re
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ESO field names vary, usually 'DOMESTIC_MW' or 'ND' (National Demand)
+_DEMAND_RE = re.compile(r"DEMAND|MW", re.I)
+
+
+def _half_hour_slots(periods=48):
+    """
+    Returns the next `periods` UTC half-hour slots as a DatetimeIndex plus
+    their ISO strings, formatted in one vectorised pass.
+    """
+    start = pd.Timestamp.now(tz="UTC").floor("30min")
+    slots = pd.date_range(start=start, periods=periods, freq="30min")
+    return slots, slots.strftime("%Y-%m-%dT%H:%M:%SZ").tolist()
+
+
 class GridDataFetcher:
     def __init__(self):
         self.headers = {
@@ -18,6 +33,8 @@ class GridDataFetcher:
         # Updated Resource ID for National Grid ESO (Day Ahead Demand Forecast)
         self.eso_resource_id = "aec5601a-7f3e-4c4c-bf56-d8e4184d3c5b" 
         self.eso_base_url = "https://api.neso.energy/api/3/action/datastore_search"
+        # Resolved demand column per ESO resource_id (schema is stable per resource)
+        self._demand_col_cache = {}
 
     def fetch_carbon_forecast_48h(self):
         """
@@ -26,22 +43,19 @@ class GridDataFetcher:
         """
         try:
             # Get current time in correct format (YYYY-MM-DDThh:mmZ)
-            now = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%MZ")
+            now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%MZ")
             url = f"{self.carbon_base}/intensity/{now}/fw48h"
             
             response = requests.get(url, headers=self.headers)
             response.raise_for_status()
             data = response.json().get('data', [])
             
-            cleaned_data = []
-            for entry in data:
-                cleaned_data.append({
-                    'timestamp': entry['from'],
-                    'forecast_gco2': entry['intensity']['forecast'],
-                    'index': entry['intensity']['index']
-                })
-            logger.info(f"Fetched {len(cleaned_data)} forecast points.")
-            return pd.DataFrame(cleaned_data)
+            records = [
+                (entry['from'], entry['intensity']['forecast'], entry['intensity']['index'])
+                for entry in data
+            ]
+            logger.info(f"Fetched {len(records)} forecast points.")
+            return pd.DataFrame.from_records(records, columns=['timestamp', 'forecast_gco2', 'index'])
         except Exception as e:
             logger.error(f"Failed to fetch carbon forecast: {e}")
             return pd.DataFrame()
@@ -60,14 +74,15 @@ class GridDataFetcher:
             raw_data = response.json().get('data', [])[0]
             regions = raw_data.get('regions', [])
             
-            cleaned_data = []
-            for r in regions:
-                cleaned_data.append({
+            cleaned_data = [
+                {
                     'region_id': r['regionid'],
                     'short_name': r['shortname'], # e.g., "North Scotland"
                     'intensity_gco2': r['intensity']['forecast'],
                     'generation_mix': r['generationmix'] # breakdown of fuel types
-                })
+                }
+                for r in regions
+            ]
             logger.info(f"Fetched data for {len(cleaned_data)} regions.")
             return cleaned_data
         except Exception as e:
@@ -106,9 +121,13 @@ class GridDataFetcher:
                 if result:
                     # Parse real data
                     df = pd.DataFrame(result)
-                    # ESO field names vary, usually 'DOMESTIC_MW' or 'ND' (National Demand)
-                    # We look for common keys
-                    val_col = next((c for c in df.columns if 'DEMAND' in c.upper() or 'MW' in c.upper()), None)
+                    rid = self.eso_resource_id
+                    val_col = self._demand_col_cache.get(rid)
+                    if val_col not in df.columns:
+                        # We look for common keys
+                        val_col = next((c for c in df.columns if _DEMAND_RE.search(c)), None)
+                        if val_col:
+                            self._demand_col_cache[rid] = val_col
                     if val_col:
                         return df[[val_col]].rename(columns={val_col: 'demand_mw'})
             
@@ -121,12 +140,9 @@ class GridDataFetcher:
 
     def _generate_fallback_demand(self):
         """Generates a realistic UK demand curve (Duck Curve)"""
-        now = datetime.datetime.utcnow()
+        slots, iso = _half_hour_slots()
         data = []
-        for i in range(48):
-            time_slot = now + datetime.timedelta(minutes=30*i)
-            hour = time_slot.hour
-            
+        for i, hour in enumerate(slots.hour):
             # UK Base load ~25GW, Peak ~45GW
             base_demand = 25000 
             if 7 <= hour <= 10: # Morning Pickup
@@ -144,7 +160,7 @@ class GridDataFetcher:
             stress_score = (load - 20000) / (45000 - 20000) # Normalize 0-1
             
             data.append({
-                'timestamp': time_slot.isoformat() + "Z",
+                'timestamp': iso[i],
                 'demand_mw': int(load),
                 'grid_stress_score': round(stress_score, 2)
             })
@@ -155,13 +171,10 @@ class GridDataFetcher:
         Simulates Wholesale Price (£/MWh).
         (Real BMRS API requires a registered key, using high-fidelity simulation).
         """
-        now = datetime.datetime.utcnow()
+        slots, iso = _half_hour_slots()
         data = []
-        for i in range(48):
-            time_slot = now + datetime.timedelta(minutes=30*i)
-            
+        for i, hour in enumerate(slots.hour):
             # Price spikes in evening, negative pricing possible at noon if sunny
-            hour = time_slot.hour
             base_price = 70
             
             if 17 <= hour <= 19:
@@ -172,7 +185,7 @@ class GridDataFetcher:
             volatility = random.uniform(-10, 20)
             
             data.append({
-                'timestamp': time_slot.isoformat() + "Z",
+                'timestamp': iso[i],
                 'price_gbp_mwh': round(max(-50, base_price + volatility), 2)
             })
         return pd.DataFrame(data)
\ No newline at end of file
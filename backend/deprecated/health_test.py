@@ -906,7 +906,7 @@ def api_reset_all():
     # Reset BG
     try:
         response = requests.post(f"{SERVICES['bg']['url']}/beckn/reset", timeout=15)
-        if response.status_code == 200:
+        if response.status_code in (200, 202):  # 202: DB notifications still being cleared
             results["bg"] = {"status": "success", "data": response.json()}
         else:
             results["bg"] = {"status": "error", "code": response.status_code}
@@ -0,0 +1,50 @@
+-- =============================================================================
+-- MIGRATION: Add bg_log_decision RPC for single round-trip decision logging
+-- =============================================================================
+-- BG.py logs every LLM orchestration decision. Without this function it needs
+-- three HTTP round-trips (workload lookup, DC lookup, insert). This function
+-- resolves the workload and target DC UUIDs server-side and inserts the
+-- decision in one call. BG.py falls back to the client-side path if the
+-- function is not installed.
+-- =============================================================================
+
+CREATE OR REPLACE FUNCTION bg_log_decision(
+    p_job_id TEXT,
+    p_dc_id TEXT,
+    p_payload JSONB
+)
+RETURNS SETOF orchestration_decisions AS $$
+    INSERT INTO orchestration_decisions (
+        decision_id,
+        decision_type,
+        agent_id,
+        workload_id,
+        target_dc_id,
+        input_carbon_intensity,
+        input_grid_stress,
+        input_price_gbp_mwh,
+        reasoning,
+        constraints_evaluated,
+        alternatives_considered,
+        decided_at
+    )
+    SELECT
+        p_payload->>'decision_id',
+        p_payload->>'decision_type',
+        (p_payload->>'agent_id')::UUID,
+        (SELECT id FROM compute_workloads WHERE job_id = p_job_id LIMIT 1),
+        (SELECT id FROM data_centres WHERE dc_id = p_dc_id LIMIT 1),
+        ROUND((p_payload->>'input_carbon_intensity')::NUMERIC)::INTEGER,
+        (p_payload->>'input_grid_stress')::DECIMAL(4,3),
+        (p_payload->>'input_price_gbp_mwh')::DECIMAL(10,2),
+        p_payload->>'reasoning',
+        COALESCE(p_payload->'constraints_evaluated', '{}'::JSONB),
+        COALESCE(p_payload->'alternatives_considered', '[]'::JSONB),
+        COALESCE((p_payload->>'decided_at')::TIMESTAMPTZ, NOW())
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- Verify the migration
+SELECT proname, pg_get_function_arguments(oid) AS arguments
+FROM pg_proc
+WHERE proname = 'bg_log_decision';
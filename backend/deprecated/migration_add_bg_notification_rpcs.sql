@@ -0,0 +1,33 @@
+-- =============================================================================
+-- MIGRATION: Add bg_unprocessed_count / bg_mark_all_processed RPCs
+-- =============================================================================
+-- BG.py's /beckn/status reports how many workload notifications are still
+-- unprocessed, and /beckn/reset marks them all processed. Through PostgREST
+-- the count query ships every matching row id, and reset needs a count and
+-- an update (two round-trips). These functions return just the number, and
+-- reset updates and counts in a single call. BG.py falls back to the
+-- PostgREST queries if the functions are not installed.
+-- =============================================================================
+
+CREATE OR REPLACE FUNCTION bg_unprocessed_count()
+RETURNS BIGINT AS $$
+    SELECT count(*)
+    FROM workload_notifications
+    WHERE processed = FALSE;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION bg_mark_all_processed()
+RETURNS BIGINT AS $$
+    WITH updated AS (
+        UPDATE workload_notifications
+        SET processed = TRUE
+        WHERE processed = FALSE
+        RETURNING 1
+    )
+    SELECT count(*) FROM updated;
+$$ LANGUAGE sql;
+
+-- Verify the migration
+SELECT proname, pg_get_function_arguments(oid) AS arguments
+FROM pg_proc
+WHERE proname IN ('bg_unprocessed_count', 'bg_mark_all_processed');
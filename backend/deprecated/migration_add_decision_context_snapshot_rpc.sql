@@ -0,0 +1,83 @@
+-- =============================================================================
+-- MIGRATION: Add get_decision_context_snapshot RPC for single round-trip context builds
+-- =============================================================================
+-- BG.py builds a decision context for every workload from four queries
+-- (grid signals, regional signals, active data centres, generation mix).
+-- This function returns all four result sets in one JSON object, shaped like
+-- the PostgREST responses (including the embedded regions objects), so a
+-- context needs a single HTTP round-trip. BG.py falls back to the separate
+-- queries if the function is not installed.
+-- =============================================================================
+
+CREATE OR REPLACE FUNCTION get_decision_context_snapshot()
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'grid_signals', COALESCE((
+            SELECT jsonb_agg(to_jsonb(g) ORDER BY g.timestamp DESC)
+            FROM (
+                SELECT timestamp, carbon_intensity_forecast, carbon_intensity_actual, carbon_index,
+                       demand_mw, grid_stress_score, wholesale_price_gbp_mwh
+                FROM grid_signals
+                ORDER BY timestamp DESC
+                LIMIT 10
+            ) g
+        ), '[]'::JSONB),
+        'regional_signals', COALESCE((
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'timestamp', s.timestamp,
+                    'carbon_intensity_forecast', s.carbon_intensity_forecast,
+                    'carbon_index', s.carbon_index,
+                    'regions', (
+                        SELECT jsonb_build_object('short_name', r.short_name, 'country', r.country, 'region_id', r.region_id)
+                        FROM regions r
+                        WHERE r.id = s.region_id
+                    )
+                )
+                ORDER BY s.timestamp DESC
+            )
+            FROM (
+                SELECT * FROM regional_grid_signals
+                ORDER BY timestamp DESC
+                LIMIT 20
+            ) s
+        ), '[]'::JSONB),
+        'data_centres', COALESCE((
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'id', d.id,
+                    'dc_id', d.dc_id,
+                    'name', d.name,
+                    'location_region', d.location_region,
+                    'pue', d.pue,
+                    'total_capacity_teraflops', d.total_capacity_teraflops,
+                    'flexibility_rating', d.flexibility_rating,
+                    'current_carbon_intensity', d.current_carbon_intensity,
+                    'current_load_percentage', d.current_load_percentage,
+                    'status', d.status,
+                    'region_info', (
+                        SELECT jsonb_build_object('short_name', r.short_name, 'country', r.country)
+                        FROM regions r
+                        WHERE r.id = d.region_id
+                    )
+                )
+            )
+            FROM data_centres d
+            WHERE d.status = 'ACTIVE'
+        ), '[]'::JSONB),
+        'generation_mix', COALESCE((
+            SELECT jsonb_agg(to_jsonb(m) ORDER BY m.timestamp DESC)
+            FROM (
+                SELECT timestamp, fuel_type, percentage
+                FROM generation_mix
+                ORDER BY timestamp DESC
+                LIMIT 20
+            ) m
+        ), '[]'::JSONB)
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Verify the migration
+SELECT proname, pg_get_function_arguments(oid) AS arguments
+FROM pg_proc
+WHERE proname = 'get_decision_context_snapshot';
@@ -0,0 +1,25 @@
+-- =============================================================================
+-- MIGRATION: Add v_system_state() RPC for the system state overview
+-- =============================================================================
+-- SupabaseClient.get_system_state() calls rpc("v_system_state"), but the
+-- schema only defines v_system_state as a view, which PostgREST does not
+-- expose as an RPC. Every call therefore fell back to two HTTP queries (all
+-- data centres with their regions, then the latest grid signal). This
+-- function returns the view's counters plus the latest grid signal as one
+-- JSON object in a single round-trip. The client keeps the two-query
+-- fallback if the function is not installed.
+-- =============================================================================
+
+CREATE OR REPLACE FUNCTION v_system_state()
+RETURNS JSONB AS $$
+    SELECT to_jsonb(s) || jsonb_build_object(
+        'latest_signal',
+        (SELECT to_jsonb(g) FROM grid_signals g ORDER BY g.timestamp DESC LIMIT 1)
+    )
+    FROM v_system_state s;
+$$ LANGUAGE sql STABLE;
+
+-- Verify the migration
+SELECT proname, pg_get_function_arguments(oid) AS arguments
+FROM pg_proc
+WHERE proname = 'v_system_state';
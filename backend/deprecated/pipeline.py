@@ -162,17 +162,19 @@ class DegPipeline:
             try:
                 persisted_regional = self.db.upsert_regional_signals_batch(regional_objects)
 
-                # Also persist generation mix for each region
+                # Also persist generation mix for each region, in a single insert
+                mix_records = []
                 for i, reg_signal in enumerate(persisted_regional):
                     if i < len(regional_objects) and regional_objects[i].get('mix'):
-                        try:
-                            self.db.insert_generation_mix(
-                                mix_data=regional_objects[i]['mix'],
-                                regional_signal_id=reg_signal.get('id'),
-                                timestamp=run_timestamp
-                            )
-                        except Exception as e:
-                            logger.warning(f"Failed to persist regional gen mix: {e}")
+                        mix_records.extend(self.db.generation_mix_records(
+                            mix_data=regional_objects[i]['mix'],
+                            regional_signal_id=reg_signal.get('id'),
+                            timestamp=run_timestamp
+                        ))
+                try:
+                    self.db.insert_generation_mix_records(mix_records)
+                except Exception as e:
+                    logger.warning(f"Failed to persist regional gen mix: {e}")
             except Exception as e:
                 logger.error(f"Failed to persist regional signals: {e}")
 
@@ -5,15 +5,235 @@ Handles all database operations with Supabase using the Ontology schema.
 """
 
 import os
+import time
+import hashlib
 import logging
+import importlib.util
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 from datetime import datetime, timezone
+from types import MappingProxyType
+from urllib.parse import quote
 from typing import Optional
+import httpx
+import orjson
 from supabase import create_client, Client
 
+try:
+    import psycopg  # optional: direct Postgres for the hot write paths
+    import psycopg.conninfo
+    from psycopg.types.json import Jsonb
+except ImportError:
+    psycopg = None
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+REGION_CACHE_SIZE = 256  # short_name -> region entries kept (LRU)
+REGION_MISS_TTL = 60  # seconds an unknown short_name is remembered before re-querying
+IDENTITY_CACHE_TTL = 300  # seconds data centre / agent rows are served from cache
+IDENTITY_CACHE_SIZE = 1024  # entries per identity cache before it is cleared
+REST_CHUNK_SIZE = 500  # rows per PostgREST request for large batch writes
+REST_WORKERS = 8  # concurrent PostgREST requests per batch
+REST_MAX_KEEPALIVE = 20  # pooled connections kept open for the raw PostgREST reads
+REST_TIMEOUT = 30  # seconds
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+# The direct connection only runs the fixed statements below, so each is
+# prepared server-side on first use and its plan reused for every batch row
+PG_PREPARE_THRESHOLD = 0
+# Supavisor's transaction-mode pooler port. Sessions there are shared between
+# clients per transaction, so server-side prepared statements must be off
+SUPAVISOR_TRANSACTION_PORT = 6543
+
+# Generator workload type names -> workload_type enum values
+WORKLOAD_TYPE_MAP = MappingProxyType({
+    "Training_Run": "TRAINING_RUN",
+    "Inference_Batch": "INFERENCE_BATCH",
+    "RAG_Query": "RAG_QUERY",
+    "Fine_Tuning": "FINE_TUNING",
+    "Data_Processing": "DATA_PROCESSING"
+})
+_workload_type_cache: dict = {}
+
+
+def _norm_type(workload_type: str) -> str:
+    """Map a workload type to its enum value, normalizing unknown names once per distinct string"""
+    normalized = _workload_type_cache.get(workload_type)
+    if normalized is None:
+        normalized = WORKLOAD_TYPE_MAP.get(workload_type) or workload_type.upper().replace(" ", "_")
+        _workload_type_cache[workload_type] = normalized
+    return normalized
+
+
+# PostgREST / Postgres error codes for an RPC whose function does not exist
+MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+
+def _is_missing_function_error(error: Exception) -> bool:
+    """Check whether an RPC failed because its function is not installed"""
+    if getattr(error, "code", None) in MISSING_FUNCTION_CODES:
+        return True
+    message = str(error)
+    return any(code in message for code in MISSING_FUNCTION_CODES)
+
+# =============================================================================
+# DIRECT POSTGRES STATEMENTS
+# =============================================================================
+# Used for the hot write paths when SUPABASE_DB_URL is set and psycopg is
+# installed; everything else (and any failure here) goes through PostgREST.
+# Rows come back through to_json so callers see the same dicts PostgREST returns.
+
+# Batch rows are built as tuples in these column orders (None -> NULL), which
+# is what executemany/COPY take; the PostgREST fallback zips them back to dicts.
+GRID_SIGNAL_COLUMNS = (
+    "timestamp", "carbon_intensity_forecast", "carbon_index", "demand_mw",
+    "grid_stress_score", "wholesale_price_gbp_mwh", "is_forecast", "fetched_at"
+)
+REGIONAL_SIGNAL_COLUMNS = (
+    "region_id", "timestamp", "carbon_intensity_forecast", "carbon_index", "fetched_at"
+)
+GENERATION_MIX_COLUMNS = (
+    "timestamp", "fuel_type", "percentage", "fetched_at", "grid_signal_id", "regional_signal_id"
+)
+WORKLOAD_COLUMNS = (
+    "job_id", "host_dc_id", "workload_type", "urgency", "required_gpu_mins",
+    "required_cpu_cores", "required_memory_gb", "estimated_energy_kwh", "carbon_cap_gco2",
+    "max_price_gbp", "deadline", "deferral_window_mins", "status", "created_at"
+)
+
+
+def _insert_sql(table: str, columns: tuple, conflict: tuple = ()) -> str:
+    """
+    INSERT (or upsert on the conflict columns) with positional params, returning
+    to_json rows. An upsert keeps the stored value where the new row has NULL,
+    as the PostgREST path does by leaving None fields out of the payload.
+    """
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    if conflict:
+        updates = ", ".join(f"{c} = COALESCE(EXCLUDED.{c}, {table}.{c})" for c in columns if c not in conflict)
+        sql += f" ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET {updates}"
+    return f"{sql} RETURNING to_json({table}.*)"
+
+
+GRID_SIGNAL_UPSERT_SQL = _insert_sql("grid_signals", GRID_SIGNAL_COLUMNS, ("timestamp",))
+REGIONAL_SIGNAL_UPSERT_SQL = _insert_sql(
+    "regional_grid_signals", REGIONAL_SIGNAL_COLUMNS, ("region_id", "timestamp")
+)
+WORKLOAD_INSERT_SQL = _insert_sql("compute_workloads", WORKLOAD_COLUMNS)
+
+# generation_mix is append-only, so it is streamed in with COPY
+GENERATION_MIX_COPY_SQL = f"COPY generation_mix ({', '.join(GENERATION_MIX_COLUMNS)}) FROM STDIN"
+
+
+# Updates the agent and records the change in agent_states in one statement;
+# returns nothing if the agent does not exist
+AGENT_STATE_SQL = """
+WITH updated AS (
+    UPDATE agents
+    SET status = %(status)s, current_task = %(current_task)s, last_action_at = %(at)s
+    WHERE agent_id = %(agent_id)s
+    RETURNING *
+), recorded AS (
+    INSERT INTO agent_states (agent_id, status, state_data, recorded_at)
+    SELECT id, %(status)s, %(state_data)s, %(at)s FROM updated
+)
+SELECT to_json(updated.*) FROM updated
+"""
+
+# Pre-built PostgREST paths for the single-row getters ({} = URL-quoted key)
+REGION_BY_SHORT_NAME_PATH = "/regions?select=*&short_name=eq.{}&limit=1"
+REGION_BY_ID_PATH = "/regions?select=*&region_id=eq.{}&limit=1"
+LATEST_GRID_SIGNAL_PATH = "/grid_signals?select=*&order=timestamp.desc&limit=1"
+DATA_CENTRE_BY_DC_ID_PATH = "/data_centres?select=*&dc_id=eq.{}&limit=1"
+AGENT_BY_ID_PATH = "/agents?select=*&agent_id=eq.{}&limit=1"
+OPERATOR_BY_NAME_PATH = "/operators?select=*&name=eq.{}&limit=1"
+
+
+def _rest_records(columns: tuple, rows: list) -> list:
+    """Turn column-ordered rows into PostgREST records, leaving NULLs to column defaults"""
+    return [{c: v for c, v in zip(columns, row) if v is not None} for row in rows]
+
+
+# =============================================================================
+# ROW BUILDERS (shared by the single-row and batch writers)
+# =============================================================================
+
+def _grid_signal_row(signal: dict, fetched_at: Optional[str]) -> tuple:
+    """Grid signal in GRID_SIGNAL_COLUMNS order"""
+    return (
+        signal.get("timestamp"),
+        signal.get("carbon_intensity"),
+        signal.get("index"),
+        signal.get("demand_mw"),
+        signal.get("grid_stress"),
+        signal.get("wholesale_price"),
+        signal.get("is_forecast", True),
+        fetched_at
+    )
+
+
+def _workload_row(workload: dict, dc_uuid: Optional[str], created_at_default: str) -> tuple:
+    """Compute workload in WORKLOAD_COLUMNS order"""
+    return (
+        workload.get("job_id"),
+        dc_uuid,
+        _norm_type(workload.get("type", "OTHER")),
+        workload.get("urgency", "MEDIUM"),
+        workload.get("required_gpu_mins"),
+        workload.get("required_cpu_cores"),
+        workload.get("required_memory_gb"),
+        workload.get("estimated_energy_kwh"),
+        workload.get("carbon_cap_gco2"),
+        workload.get("max_price_gbp"),
+        workload.get("deadline"),
+        workload.get("deferral_window_mins"),
+        workload.get("status", "PENDING"),
+        workload.get("created_at", created_at_default)
+    )
+
+
+def _data_centre_record(dc: dict, region_uuid: Optional[str]) -> dict:
+    """Data centre upsert record (None values dropped)"""
+    data = {
+        "dc_id": dc.get("dc_id"),
+        "name": dc.get("name"),
+        "region_id": region_uuid,
+        "location_region": dc.get("location_region"),
+        "pue": dc.get("pue"),
+        "total_capacity_teraflops": dc.get("total_capacity_teraflops"),
+        "flexibility_rating": dc.get("flexibility_rating"),
+        "current_carbon_intensity": dc.get("current_carbon_intensity"),
+        "status": dc.get("status", "ACTIVE")
+    }
+    return {k: v for k, v in data.items() if v is not None}
+
+
+# Resolves the agent, workload and DC keys to UUIDs inline, so a decision is
+# one round trip instead of up to four lookups plus the insert. Scalar
+# subqueries (not joined CTEs) keep an unknown key as NULL rather than
+# dropping the row.
+DECISION_INSERT_SQL = """
+INSERT INTO orchestration_decisions (
+    decision_id, decision_type, agent_id, workload_id, source_dc_id, target_dc_id,
+    input_carbon_intensity, input_grid_stress, input_price_gbp_mwh, reasoning,
+    constraints_evaluated, alternatives_considered, carbon_saved_gco2, cost_saved_gbp,
+    flexibility_contribution_mw, decided_at
+)
+SELECT
+    %(decision_id)s, %(decision_type)s,
+    (SELECT id FROM agents WHERE agent_id = %(agent_key)s LIMIT 1),
+    (SELECT id FROM compute_workloads WHERE job_id = %(workload_job_id)s LIMIT 1),
+    (SELECT id FROM data_centres WHERE dc_id = %(source_dc_key)s LIMIT 1),
+    (SELECT id FROM data_centres WHERE dc_id = %(target_dc_key)s LIMIT 1),
+    %(input_carbon_intensity)s, %(input_grid_stress)s, %(input_price_gbp_mwh)s,
+    %(reasoning)s, %(constraints_evaluated)s, %(alternatives_considered)s,
+    %(carbon_saved_gco2)s, %(cost_saved_gbp)s, %(flexibility_contribution_mw)s,
+    %(decided_at)s
+RETURNING to_json(orchestration_decisions.*)
+"""
+
 
 class SupabaseClient:
     """
@@ -24,7 +244,10 @@ class SupabaseClient:
     def __init__(
         self,
         url: Optional[str] = None,
-        key: Optional[str] = None
+        key: Optional[str] = None,
+        db_url: Optional[str] = None,
+        chunk_size: int = REST_CHUNK_SIZE,
+        warm: bool = True
     ):
         """
         Initialize Supabase client.
@@ -32,9 +255,13 @@ class SupabaseClient:
         Args:
             url: Supabase project URL (or set SUPABASE_URL env var)
             key: Supabase service key (or set SUPABASE_KEY env var)
+            db_url: Postgres DSN for direct writes (or set SUPABASE_DB_URL env var, optional)
+            chunk_size: Rows per PostgREST request for batch writes (lower it if rate limited)
+            warm: Preload the region, data centre and agent caches (see warm_caches)
         """
         self.url = url or os.environ.get("SUPABASE_URL")
         self.key = key or os.environ.get("SUPABASE_KEY")
+        self.db_url = db_url or os.environ.get("SUPABASE_DB_URL")
 
         if not self.url or not self.key:
             raise ValueError(
@@ -45,8 +272,178 @@ class SupabaseClient:
         self.client: Client = create_client(self.url, self.key)
         logger.info(f"Supabase client initialized for {self.url}")
 
-        # Cache for region UUID lookups
-        self._region_cache: dict = {}
+        # Keep-alive session (HTTP/2 when h2 is installed) for the hot
+        # single-row reads, which go straight to PostgREST
+        self._http = httpx.Client(
+            base_url=f"{self.url}/rest/v1",
+            headers={"apikey": self.key, "Authorization": f"Bearer {self.key}"},
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_keepalive_connections=REST_MAX_KEEPALIVE),
+            timeout=REST_TIMEOUT
+        )
+
+        # Cache for region UUID lookups (LRU), plus recently missed short names
+        self._region_cache: OrderedDict = OrderedDict()
+        self._region_miss_cache: dict = {}
+
+        # dc_id / agent_id -> (row, expires_at); refreshed on upsert
+        self._dc_cache: dict = {}
+        self._agent_cache: dict = {}
+
+        # Last upserted content per single-row writer: name -> (digest, stored row)
+        self._last_upsert: dict = {}
+
+        # v_system_state() RPC (optional migration); disabled if the function is not installed
+        self._system_state_rpc_available = True
+
+        # Full region index for the batch writers, loaded on first use
+        self._region_by_short: Optional[dict] = None
+        self._region_by_id: Optional[dict] = None
+
+        # Large PostgREST batch writes are split into chunks sent concurrently
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=REST_WORKERS, thread_name_prefix="supabase-rest")
+
+        # Direct Postgres connection for the hot write paths, opened on first use
+        self._pg = None
+        self._pg_available = psycopg is not None and bool(self.db_url)
+        # One transaction at a time on the shared connection
+        self._pg_lock = Lock()
+
+        if warm:
+            self.warm_caches()
+
+    # =========================================================================
+    # DIRECT POSTGRES
+    # =========================================================================
+
+    def _pg_connection(self):
+        """Get the direct Postgres connection, connecting on first use (None if unavailable)"""
+        if self._pg is None and self._pg_available:
+            try:
+                pooled = psycopg.conninfo.conninfo_to_dict(self.db_url).get("port") == str(SUPAVISOR_TRANSACTION_PORT)
+                self._pg = psycopg.connect(
+                    self.db_url,
+                    autocommit=True,
+                    prepare_threshold=None if pooled else PG_PREPARE_THRESHOLD
+                )
+                logger.info("Direct Postgres connection opened for batch writes")
+            except psycopg.Error as e:
+                logger.warning(f"Direct Postgres unavailable, using PostgREST: {e}")
+                self._pg_available = False
+        return self._pg
+
+    def _pg_write(self, sql: str, records: list) -> Optional[list]:
+        """
+        Run a RETURNING to_json(...) statement once per record in a single
+        pipelined transaction. Returns the written rows, or None if the direct
+        connection is unavailable or the write failed (nothing is committed
+        then), so the caller can fall back to PostgREST.
+        """
+        with self._pg_lock:
+            conn = self._pg_connection()
+            if conn is None:
+                return None
+
+            try:
+                rows = []
+                with conn.transaction(), conn.cursor() as cur:
+                    cur.executemany(sql, records, returning=True)
+                    while True:
+                        rows.extend(row[0] for row in cur.fetchall())
+                        if not cur.nextset():
+                            break
+                return rows
+            except psycopg.Error as e:
+                self._pg_reset(e)
+                return None
+
+    def _pg_copy(self, sql: str, rows: list) -> bool:
+        """
+        COPY column-ordered rows into an append-only table in one transaction.
+        Returns False if the direct connection is unavailable or the copy
+        failed, so the caller can fall back to PostgREST.
+        """
+        with self._pg_lock:
+            conn = self._pg_connection()
+            if conn is None:
+                return False
+
+            try:
+                with conn.transaction(), conn.cursor() as cur:
+                    with cur.copy(sql) as copy:
+                        for row in rows:
+                            copy.write_row(row)
+                return True
+            except psycopg.Error as e:
+                self._pg_reset(e)
+                return False
+
+    def _pg_reset(self, error: Exception):
+        """Drop the direct connection after a failed write; the next write reconnects"""
+        logger.warning(f"Direct Postgres write failed, falling back to PostgREST: {error}")
+        try:
+            self._pg.close()
+        except psycopg.Error:
+            pass
+        self._pg = None
+
+    def _rest_get(self, table: str, params: dict) -> list:
+        """GET rows from PostgREST over the keep-alive session"""
+        response = self._http.get(f"/{table}", params=params)
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    def _rest_get_one(self, path_template: str, key=None) -> Optional[dict]:
+        """GET the first row for a pre-built path template, or None"""
+        path = path_template if key is None else path_template.format(quote(str(key), safe=""))
+        response = self._http.get(path)
+        response.raise_for_status()
+        return orjson.loads(response.content)[0] if response.content != b"[]" else None
+
+    def _rest_post(self, table: str, records: list, on_conflict: Optional[str] = None) -> list:
+        """POST records to PostgREST as one orjson-encoded body, returning the written rows"""
+        # Records may omit different None columns; columns lists them all and
+        # missing=default fills the gaps from column defaults
+        columns = dict.fromkeys(key for record in records for key in record)
+        params = {"columns": ",".join(columns)}
+        prefer = "return=representation,missing=default"
+        if on_conflict:
+            params["on_conflict"] = on_conflict
+            prefer = f"resolution=merge-duplicates,{prefer}"
+
+        response = self._http.post(
+            f"/{table}",
+            params=params,
+            content=orjson.dumps(records),
+            headers={"Content-Type": "application/json", "Prefer": prefer}
+        )
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    def _rest_write(self, table: str, records: list, on_conflict: Optional[str] = None) -> list:
+        """
+        Insert (or upsert on on_conflict) records through PostgREST. Batches
+        larger than chunk_size are sent as concurrent chunk requests; rows
+        come back in input order, but each chunk commits on its own.
+        """
+        def write(chunk: list) -> list:
+            return self._rest_post(table, chunk, on_conflict)
+
+        if len(records) <= self.chunk_size:
+            return write(records)
+
+        chunks = [records[i:i + self.chunk_size] for i in range(0, len(records), self.chunk_size)]
+        return [row for rows in self._executor.map(write, chunks) for row in rows]
+
+    def close(self):
+        """Release the thread pool and connections"""
+        self._executor.shutdown(wait=True)
+        self._http.close()
+        with self._pg_lock:
+            if self._pg is not None:
+                self._pg.close()
+                self._pg = None
 
     # =========================================================================
     # REGION OPERATIONS
@@ -54,33 +451,99 @@ class SupabaseClient:
 
     def get_region_by_short_name(self, short_name: str) -> Optional[dict]:
         """Get region by short name (e.g., 'North Scotland')"""
-        if short_name in self._region_cache:
-            return self._region_cache[short_name]
-
-        result = self.client.table("regions") \
-            .select("*") \
-            .eq("short_name", short_name) \
-            .execute()
-
-        if result.data:
-            self._region_cache[short_name] = result.data[0]
-            return result.data[0]
+        region = self._region_cache.get(short_name)
+        if region is not None:
+            self._region_cache.move_to_end(short_name)
+            return region
+
+        missed_at = self._region_miss_cache.get(short_name)
+        if missed_at is not None and time.monotonic() - missed_at < REGION_MISS_TTL:
+            return None
+
+        region = self._rest_get_one(REGION_BY_SHORT_NAME_PATH, short_name)
+
+        if region is not None:
+            self._region_miss_cache.pop(short_name, None)
+            self._region_cache[short_name] = region
+            if len(self._region_cache) > REGION_CACHE_SIZE:
+                self._region_cache.popitem(last=False)
+            return region
+
+        if len(self._region_miss_cache) >= REGION_CACHE_SIZE:
+            self._region_miss_cache.clear()
+        self._region_miss_cache[short_name] = time.monotonic()
         return None
 
     def get_region_by_id(self, region_id: int) -> Optional[dict]:
         """Get region by Carbon API region ID (1-17)"""
-        result = self.client.table("regions") \
-            .select("*") \
-            .eq("region_id", region_id) \
-            .execute()
-
-        return result.data[0] if result.data else None
+        return self._rest_get_one(REGION_BY_ID_PATH, region_id)
 
     def get_all_regions(self) -> list:
         """Get all regions"""
         result = self.client.table("regions").select("*").execute()
         return result.data or []
 
+    def _ensure_region_index(self):
+        """Load every region once so batch writers can look them up in memory"""
+        if self._region_by_short is None:
+            regions = self.get_all_regions()
+            self._region_by_short = {r["short_name"]: r for r in regions}
+            self._region_by_id = {r["region_id"]: r for r in regions}
+
+    def _cache_get(self, cache: dict, key: str) -> Optional[dict]:
+        """Return a cached row if it has not expired"""
+        entry = cache.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def _cache_put(self, cache: dict, key: str, row: dict):
+        """Cache a row for IDENTITY_CACHE_TTL seconds"""
+        if len(cache) >= IDENTITY_CACHE_SIZE:
+            cache.clear()
+        cache[key] = (row, time.monotonic() + IDENTITY_CACHE_TTL)
+
+    def warm_caches(self):
+        """
+        Load all regions, data centres and agents concurrently (one round-trip
+        of wall time) so the first pipeline run does not miss every cache.
+        Failures are logged; the caches then fill on demand as before.
+        """
+        try:
+            regions, dcs, agents = self._executor.map(lambda fetch: fetch(), [
+                self.get_all_regions,
+                self.get_all_data_centres,
+                lambda: self._rest_get("agents", {"select": "*"})
+            ])
+        except Exception as e:
+            logger.warning(f"Cache warm-up failed: {e}")
+            return
+
+        self._region_by_short = {r["short_name"]: r for r in regions}
+        self._region_by_id = {r["region_id"]: r for r in regions}
+        for region in regions[:REGION_CACHE_SIZE]:
+            self._region_cache[region["short_name"]] = region
+        for dc in dcs:
+            self._cache_put(self._dc_cache, dc["dc_id"], dc)
+        for agent in agents:
+            self._cache_put(self._agent_cache, agent["agent_id"], agent)
+
+        logger.info(f"Warmed caches: {len(regions)} regions, {len(dcs)} data centres, {len(agents)} agents")
+
+    def invalidate_caches(self):
+        """Drop every cached lookup (regions, data centres, agents) and last-upsert digest"""
+        self.refresh_regions()
+        self._dc_cache.clear()
+        self._agent_cache.clear()
+        self._last_upsert.clear()
+
+    def refresh_regions(self):
+        """Drop cached regions so the next lookup reloads them"""
+        self._region_cache.clear()
+        self._region_miss_cache.clear()
+        self._region_by_short = None
+        self._region_by_id = None
+
     # =========================================================================
     # GRID SIGNAL OPERATIONS (Time-Series)
     # =========================================================================
@@ -91,26 +554,32 @@ class SupabaseClient:
         Uses timestamp as unique constraint.
         """
         data = {
-            "timestamp": signal.get("timestamp"),
+            **dict(zip(GRID_SIGNAL_COLUMNS, _grid_signal_row(signal, None))),
             "settlement_period": signal.get("settlement_period"),
-            "carbon_intensity_forecast": signal.get("carbon_intensity"),
-            "carbon_index": signal.get("index"),
-            "demand_mw": signal.get("demand_mw"),
-            "grid_stress_score": signal.get("grid_stress"),
-            "wholesale_price_gbp_mwh": signal.get("wholesale_price"),
-            "is_forecast": signal.get("is_forecast", True),
-            "data_source": signal.get("data_source", "carbon_intensity_api"),
-            "fetched_at": datetime.now(timezone.utc).isoformat()
+            "data_source": signal.get("data_source", "carbon_intensity_api")
         }
 
         # Remove None values
         data = {k: v for k, v in data.items() if v is not None}
 
+        # Pollers often see the same forecast twice; skip the write if this
+        # exact content (ignoring fetched_at) was the last one upserted
+        digest = hashlib.blake2b(
+            orjson.dumps(data, default=str, option=orjson.OPT_SORT_KEYS), digest_size=16
+        ).digest()
+        last = self._last_upsert.get("grid_signal")
+        if last is not None and last[0] == digest:
+            return last[1]
+
+        data["fetched_at"] = datetime.now(timezone.utc).isoformat()
         result = self.client.table("grid_signals") \
             .upsert(data, on_conflict="timestamp") \
             .execute()
 
-        return result.data[0] if result.data else {}
+        if not result.data:
+            return {}
+        self._last_upsert["grid_signal"] = (digest, result.data[0])
+        return result.data[0]
 
     def upsert_grid_signals_batch(self, signals: list) -> list:
         """Batch upsert grid signals"""
@@ -118,36 +587,20 @@ class SupabaseClient:
             return []
 
         data = []
+        fetched_at = datetime.now(timezone.utc).isoformat()
         for signal in signals:
-            record = {
-                "timestamp": signal.get("timestamp"),
-                "carbon_intensity_forecast": signal.get("carbon_intensity"),
-                "carbon_index": signal.get("index"),
-                "demand_mw": signal.get("demand_mw"),
-                "grid_stress_score": signal.get("grid_stress"),
-                "wholesale_price_gbp_mwh": signal.get("wholesale_price"),
-                "is_forecast": signal.get("is_forecast", True),
-                "fetched_at": datetime.now(timezone.utc).isoformat()
-            }
-            record = {k: v for k, v in record.items() if v is not None}
-            data.append(record)
+            data.append(_grid_signal_row(signal, fetched_at))
 
-        result = self.client.table("grid_signals") \
-            .upsert(data, on_conflict="timestamp") \
-            .execute()
+        rows = self._pg_write(GRID_SIGNAL_UPSERT_SQL, data)
+        if rows is None:
+            rows = self._rest_write("grid_signals", _rest_records(GRID_SIGNAL_COLUMNS, data), on_conflict="timestamp")
 
-        logger.info(f"Upserted {len(result.data)} grid signals")
-        return result.data or []
+        logger.info(f"Upserted {len(rows)} grid signals")
+        return rows
 
     def get_latest_grid_signal(self) -> Optional[dict]:
         """Get the most recent grid signal"""
-        result = self.client.table("grid_signals") \
-            .select("*") \
-            .order("timestamp", desc=True) \
-            .limit(1) \
-            .execute()
-
-        return result.data[0] if result.data else None
+        return self._rest_get_one(LATEST_GRID_SIGNAL_PATH)
 
     def get_grid_signals_range(self, start: datetime, end: datetime) -> list:
         """Get grid signals within a time range"""
@@ -188,37 +641,37 @@ class SupabaseClient:
 
         data = []
         timestamp = datetime.now(timezone.utc).isoformat()
+        self._ensure_region_index()
 
         for signal in signals:
             # Look up region UUID from short_name
-            region = self.get_region_by_short_name(signal.get("short_name", ""))
+            region = self._region_by_short.get(signal.get("short_name", ""))
             if not region:
                 # Try by region_id
-                region = self.get_region_by_id(signal.get("region_id"))
+                region = self._region_by_id.get(signal.get("region_id"))
 
             if not region:
                 logger.warning(f"Region not found: {signal.get('short_name')}")
                 continue
 
-            record = {
-                "region_id": region["id"],
-                "timestamp": timestamp,
-                "carbon_intensity_forecast": signal.get("intensity_gco2"),
-                "carbon_index": signal.get("index"),
-                "fetched_at": timestamp
-            }
-            record = {k: v for k, v in record.items() if v is not None}
-            data.append(record)
+            # REGIONAL_SIGNAL_COLUMNS order
+            data.append((
+                region["id"],
+                timestamp,
+                signal.get("intensity_gco2"),
+                signal.get("index"),
+                timestamp
+            ))
 
         if not data:
             return []
 
-        result = self.client.table("regional_grid_signals") \
-            .upsert(data, on_conflict="region_id,timestamp") \
-            .execute()
+        rows = self._pg_write(REGIONAL_SIGNAL_UPSERT_SQL, data)
+        if rows is None:
+            rows = self._rest_write("regional_grid_signals", _rest_records(REGIONAL_SIGNAL_COLUMNS, data), on_conflict="region_id,timestamp")
 
-        logger.info(f"Upserted {len(result.data)} regional signals")
-        return result.data or []
+        logger.info(f"Upserted {len(rows)} regional signals")
+        return rows
 
     # =========================================================================
     # GENERATION MIX OPERATIONS
@@ -240,32 +693,44 @@ class SupabaseClient:
             regional_signal_id: UUID of regional signal (optional)
             timestamp: Timestamp for the mix data
         """
-        if not mix_data:
+        return self.insert_generation_mix_records(self.generation_mix_records(
+            mix_data, grid_signal_id, regional_signal_id, timestamp
+        ))
+
+    def generation_mix_records(
+        self,
+        mix_data: list,
+        grid_signal_id: Optional[str] = None,
+        regional_signal_id: Optional[str] = None,
+        timestamp: Optional[str] = None
+    ) -> list:
+        """Build generation_mix rows (GENERATION_MIX_COLUMNS order) so several mixes can go in one insert"""
+        fetched_at = datetime.now(timezone.utc).isoformat()
+        ts = timestamp or fetched_at
+        grid_signal_id = grid_signal_id or None
+        regional_signal_id = regional_signal_id or None
+
+        return [
+            (ts, item.get("fuel"), item.get("perc"), fetched_at, grid_signal_id, regional_signal_id)
+            for item in mix_data
+        ]
+
+    def insert_generation_mix_records(self, data: list) -> list:
+        """
+        Insert prepared generation_mix rows in one write. Over the direct
+        connection this is a COPY, which returns no rows, so the records
+        written are returned instead (without ids).
+        """
+        if not data:
             return []
 
-        ts = timestamp or datetime.now(timezone.utc).isoformat()
-        data = []
+        if self._pg_copy(GENERATION_MIX_COPY_SQL, data):
+            rows = [dict(zip(GENERATION_MIX_COLUMNS, row)) for row in data]
+        else:
+            rows = self._rest_write("generation_mix", _rest_records(GENERATION_MIX_COLUMNS, data))
 
-        for item in mix_data:
-            record = {
-                "timestamp": ts,
-                "fuel_type": item.get("fuel"),
-                "percentage": item.get("perc"),
-                "fetched_at": datetime.now(timezone.utc).isoformat()
-            }
-            if grid_signal_id:
-                record["grid_signal_id"] = grid_signal_id
-            if regional_signal_id:
-                record["regional_signal_id"] = regional_signal_id
-
-            data.append(record)
-
-        result = self.client.table("generation_mix") \
-            .insert(data) \
-            .execute()
-
-        logger.info(f"Inserted {len(result.data)} generation mix records")
-        return result.data or []
+        logger.info(f"Inserted {len(rows)} generation mix records")
+        return rows
 
     # =========================================================================
     # DATA CENTRE OPERATIONS
@@ -277,24 +742,16 @@ class SupabaseClient:
         region = self.get_region_by_short_name(dc.get("location_region", ""))
         region_uuid = region["id"] if region else None
 
-        data = {
-            "dc_id": dc.get("dc_id"),
-            "name": dc.get("name"),
-            "region_id": region_uuid,
-            "location_region": dc.get("location_region"),
-            "pue": dc.get("pue"),
-            "total_capacity_teraflops": dc.get("total_capacity_teraflops"),
-            "flexibility_rating": dc.get("flexibility_rating"),
-            "current_carbon_intensity": dc.get("current_carbon_intensity"),
-            "status": dc.get("status", "ACTIVE")
-        }
-        data = {k: v for k, v in data.items() if v is not None}
+        data = _data_centre_record(dc, region_uuid)
 
         result = self.client.table("data_centres") \
             .upsert(data, on_conflict="dc_id") \
             .execute()
 
-        return result.data[0] if result.data else {}
+        if not result.data:
+            return {}
+        self._cache_put(self._dc_cache, result.data[0]["dc_id"], result.data[0])
+        return result.data[0]
 
     def upsert_data_centres_batch(self, dcs: list) -> list:
         """Batch upsert data centres"""
@@ -302,39 +759,32 @@ class SupabaseClient:
             return []
 
         data = []
+        self._ensure_region_index()
         for dc in dcs:
-            region = self.get_region_by_short_name(dc.get("location_region", ""))
+            region = self._region_by_short.get(dc.get("location_region", ""))
             region_uuid = region["id"] if region else None
-
-            record = {
-                "dc_id": dc.get("dc_id"),
-                "name": dc.get("name"),
-                "region_id": region_uuid,
-                "location_region": dc.get("location_region"),
-                "pue": dc.get("pue"),
-                "total_capacity_teraflops": dc.get("total_capacity_teraflops"),
-                "flexibility_rating": dc.get("flexibility_rating"),
-                "current_carbon_intensity": dc.get("current_carbon_intensity"),
-                "status": dc.get("status", "ACTIVE")
-            }
-            record = {k: v for k, v in record.items() if v is not None}
-            data.append(record)
+            data.append(_data_centre_record(dc, region_uuid))
 
         result = self.client.table("data_centres") \
             .upsert(data, on_conflict="dc_id") \
             .execute()
 
+        for row in result.data or []:
+            self._cache_put(self._dc_cache, row["dc_id"], row)
+
         logger.info(f"Upserted {len(result.data)} data centres")
         return result.data or []
 
     def get_data_centre_by_dc_id(self, dc_id: str) -> Optional[dict]:
-        """Get data centre by its dc_id"""
-        result = self.client.table("data_centres") \
-            .select("*") \
-            .eq("dc_id", dc_id) \
-            .execute()
+        """Get data centre by its dc_id (cached for IDENTITY_CACHE_TTL)"""
+        dc = self._cache_get(self._dc_cache, dc_id)
+        if dc is not None:
+            return dc
 
-        return result.data[0] if result.data else None
+        dc = self._rest_get_one(DATA_CENTRE_BY_DC_ID_PATH, dc_id)
+        if dc is not None:
+            self._cache_put(self._dc_cache, dc_id, dc)
+        return dc
 
     def get_all_data_centres(self) -> list:
         """Get all data centres"""
@@ -354,36 +804,9 @@ class SupabaseClient:
         dc = self.get_data_centre_by_dc_id(workload.get("host_dc_id", ""))
         dc_uuid = dc["id"] if dc else None
 
-        # Map workload type to enum
-        type_map = {
-            "Training_Run": "TRAINING_RUN",
-            "Inference_Batch": "INFERENCE_BATCH",
-            "RAG_Query": "RAG_QUERY",
-            "Fine_Tuning": "FINE_TUNING",
-            "Data_Processing": "DATA_PROCESSING"
-        }
-        workload_type = type_map.get(
-            workload.get("type"),
-            workload.get("type", "OTHER").upper().replace(" ", "_")
-        )
-
-        data = {
-            "job_id": workload.get("job_id"),
-            "host_dc_id": dc_uuid,
-            "workload_type": workload_type,
-            "urgency": workload.get("urgency", "MEDIUM"),
-            "required_gpu_mins": workload.get("required_gpu_mins"),
-            "required_cpu_cores": workload.get("required_cpu_cores"),
-            "required_memory_gb": workload.get("required_memory_gb"),
-            "estimated_energy_kwh": workload.get("estimated_energy_kwh"),
-            "carbon_cap_gco2": workload.get("carbon_cap_gco2"),
-            "max_price_gbp": workload.get("max_price_gbp"),
-            "deadline": workload.get("deadline"),
-            "deferral_window_mins": workload.get("deferral_window_mins"),
-            "status": workload.get("status", "PENDING"),
-            "created_at": workload.get("created_at", datetime.now(timezone.utc).isoformat())
-        }
-        data = {k: v for k, v in data.items() if v is not None}
+        data = _rest_records(
+            WORKLOAD_COLUMNS, [_workload_row(workload, dc_uuid, datetime.now(timezone.utc).isoformat())]
+        )[0]
 
         result = self.client.table("compute_workloads") \
             .insert(data) \
@@ -396,51 +819,21 @@ class SupabaseClient:
         if not workloads:
             return []
 
-        # Pre-fetch all DCs for lookup
-        all_dcs = self.get_all_data_centres()
+        # Pre-fetch all DC keys for lookup (just the two columns, no region join)
+        all_dcs = self._rest_get("data_centres", {"select": "id,dc_id"})
         dc_lookup = {dc["dc_id"]: dc["id"] for dc in all_dcs}
 
-        type_map = {
-            "Training_Run": "TRAINING_RUN",
-            "Inference_Batch": "INFERENCE_BATCH",
-            "RAG_Query": "RAG_QUERY",
-            "Fine_Tuning": "FINE_TUNING",
-            "Data_Processing": "DATA_PROCESSING"
-        }
-
         data = []
+        created_at_default = datetime.now(timezone.utc).isoformat()
         for wl in workloads:
-            dc_uuid = dc_lookup.get(wl.get("host_dc_id"))
-            workload_type = type_map.get(
-                wl.get("type"),
-                wl.get("type", "OTHER").upper().replace(" ", "_")
-            )
-
-            record = {
-                "job_id": wl.get("job_id"),
-                "host_dc_id": dc_uuid,
-                "workload_type": workload_type,
-                "urgency": wl.get("urgency", "MEDIUM"),
-                "required_gpu_mins": wl.get("required_gpu_mins"),
-                "required_cpu_cores": wl.get("required_cpu_cores"),
-                "required_memory_gb": wl.get("required_memory_gb"),
-                "estimated_energy_kwh": wl.get("estimated_energy_kwh"),
-                "carbon_cap_gco2": wl.get("carbon_cap_gco2"),
-                "max_price_gbp": wl.get("max_price_gbp"),
-                "deadline": wl.get("deadline"),
-                "deferral_window_mins": wl.get("deferral_window_mins"),
-                "status": wl.get("status", "PENDING"),
-                "created_at": wl.get("created_at", datetime.now(timezone.utc).isoformat())
-            }
-            record = {k: v for k, v in record.items() if v is not None}
-            data.append(record)
+            data.append(_workload_row(wl, dc_lookup.get(wl.get("host_dc_id")), created_at_default))
 
-        result = self.client.table("compute_workloads") \
-            .insert(data) \
-            .execute()
+        rows = self._pg_write(WORKLOAD_INSERT_SQL, data)
+        if rows is None:
+            rows = self._rest_write("compute_workloads", _rest_records(WORKLOAD_COLUMNS, data))
 
-        logger.info(f"Inserted {len(result.data)} workloads")
-        return result.data or []
+        logger.info(f"Inserted {len(rows)} workloads")
+        return rows
 
     def update_workload_status(self, job_id: str, status: str, **kwargs) -> dict:
         """Update workload status and optional fields"""
@@ -482,42 +875,70 @@ class SupabaseClient:
             .upsert(data, on_conflict="agent_id") \
             .execute()
 
-        return result.data[0] if result.data else {}
+        if not result.data:
+            return {}
+        self._cache_put(self._agent_cache, result.data[0]["agent_id"], result.data[0])
+        return result.data[0]
 
     def update_agent_state(self, agent_id: str, status: str, state_data: dict = None) -> dict:
-        """Update agent status and record state change"""
-        # Update agent
+        """
+        Update agent status and record the change in agent_states, returning
+        the updated agent row. Over direct Postgres this is one UPDATE + INSERT
+        statement (AGENT_STATE_SQL).
+        """
+        at = datetime.now(timezone.utc).isoformat()
+        rows = self._pg_write(AGENT_STATE_SQL, [{
+            "agent_id": agent_id,
+            "status": status,
+            "current_task": Jsonb(state_data) if state_data is not None else None,
+            "state_data": Jsonb(state_data or {}),
+            "at": at
+        }]) if self._pg_available else None
+
+        if rows is None:
+            # Deprecated fallback: UPDATE through PostgREST, then insert the agent_states row
+            agent = self._update_agent_row(agent_id, status, state_data, at)
+            rows = [agent] if agent else []
+            if agent:
+                self._rest_write("agent_states", [self._agent_state_record(agent["id"], status, state_data, at)])
+
+        if not rows:
+            return {}
+        self._cache_put(self._agent_cache, rows[0]["agent_id"], rows[0])
+        return rows[0]
+
+    def _update_agent_row(self, agent_id: str, status: str, state_data: Optional[dict], at: str) -> Optional[dict]:
+        """Set the agent's current status/task, returning the updated row"""
         agent_result = self.client.table("agents") \
             .update({
                 "status": status,
                 "current_task": state_data,
-                "last_action_at": datetime.now(timezone.utc).isoformat()
+                "last_action_at": at
             }) \
             .eq("agent_id", agent_id) \
             .execute()
 
-        if not agent_result.data:
-            return {}
+        return agent_result.data[0] if agent_result.data else None
 
-        # Record state change in agent_states
-        agent_uuid = agent_result.data[0]["id"]
-        self.client.table("agent_states").insert({
+    def _agent_state_record(self, agent_uuid: str, status: str, state_data: Optional[dict], at: str) -> dict:
+        """Build an agent_states row"""
+        return {
             "agent_id": agent_uuid,
             "status": status,
             "state_data": state_data or {},
-            "recorded_at": datetime.now(timezone.utc).isoformat()
-        }).execute()
-
-        return agent_result.data[0]
+            "recorded_at": at
+        }
 
     def get_agent_by_id(self, agent_id: str) -> Optional[dict]:
-        """Get agent by agent_id"""
-        result = self.client.table("agents") \
-            .select("*") \
-            .eq("agent_id", agent_id) \
-            .execute()
+        """Get agent by agent_id (cached for IDENTITY_CACHE_TTL)"""
+        agent = self._cache_get(self._agent_cache, agent_id)
+        if agent is not None:
+            return agent
 
-        return result.data[0] if result.data else None
+        agent = self._rest_get_one(AGENT_BY_ID_PATH, agent_id)
+        if agent is not None:
+            self._cache_put(self._agent_cache, agent_id, agent)
+        return agent
 
     def get_agent_history(self, agent_id: str, limit: int = 100) -> list:
         """Get agent state history"""
@@ -552,39 +973,24 @@ class SupabaseClient:
                 - carbon_saved_gco2: Carbon savings (optional)
                 - cost_saved_gbp: Cost savings (optional)
         """
-        import uuid
-
-        # Look up agent UUID
-        agent = self.get_agent_by_id(decision.get("agent_id", ""))
-        agent_uuid = agent["id"] if agent else None
-
-        # Look up workload UUID if provided
-        workload_uuid = None
-        if decision.get("workload_job_id"):
-            wl_result = self.client.table("compute_workloads") \
-                .select("id") \
-                .eq("job_id", decision.get("workload_job_id")) \
-                .execute()
-            if wl_result.data:
-                workload_uuid = wl_result.data[0]["id"]
+        row = self._write_decision(self._decision_record(decision))
+        logger.info(f"Logged decision: {decision.get('decision_type')} - {decision.get('decision_id')}")
+        return row
 
-        # Look up DC UUIDs if provided
-        source_dc_uuid = None
-        target_dc_uuid = None
-        if decision.get("source_dc_id"):
-            dc = self.get_data_centre_by_dc_id(decision.get("source_dc_id"))
-            source_dc_uuid = dc["id"] if dc else None
-        if decision.get("target_dc_id"):
-            dc = self.get_data_centre_by_dc_id(decision.get("target_dc_id"))
-            target_dc_uuid = dc["id"] if dc else None
+    def _decision_record(self, decision: dict) -> dict:
+        """
+        Build an orchestration_decisions row. The agent, workload and DC
+        keys are kept as *_key fields and resolved to UUIDs when written.
+        """
+        import uuid
 
-        data = {
+        return {
             "decision_id": decision.get("decision_id", str(uuid.uuid4())),
             "decision_type": decision.get("decision_type"),
-            "agent_id": agent_uuid,
-            "workload_id": workload_uuid,
-            "source_dc_id": source_dc_uuid,
-            "target_dc_id": target_dc_uuid,
+            "agent_key": decision.get("agent_id") or None,
+            "workload_job_id": decision.get("workload_job_id") or None,
+            "source_dc_key": decision.get("source_dc_id") or None,
+            "target_dc_key": decision.get("target_dc_id") or None,
             "input_carbon_intensity": decision.get("input_carbon_intensity"),
             "input_grid_stress": decision.get("input_grid_stress"),
             "input_price_gbp_mwh": decision.get("input_price"),
@@ -596,24 +1002,57 @@ class SupabaseClient:
             "flexibility_contribution_mw": decision.get("flexibility_contribution_mw"),
             "decided_at": datetime.now(timezone.utc).isoformat()
         }
-        data = {k: v for k, v in data.items() if v is not None}
 
-        result = self.client.table("orchestration_decisions") \
-            .insert(data) \
-            .execute()
+    def _write_decision(self, record: dict) -> dict:
+        """Insert one decision record, returning the stored row ({} if none)"""
+        # Direct Postgres: keys are resolved inside the INSERT
+        rows = self._pg_write(DECISION_INSERT_SQL, [{
+            **record,
+            "constraints_evaluated": Jsonb(record["constraints_evaluated"]),
+            "alternatives_considered": Jsonb(record["alternatives_considered"])
+        }]) if self._pg_available else None
+
+        if rows is None:
+            rows = self._rest_write("orchestration_decisions", [self._resolve_decision_keys(record)])
+        return rows[0] if rows else {}
+
+    def _resolve_decision_keys(self, record: dict) -> dict:
+        """Swap a decision record's *_key fields for UUIDs looked up client-side (PostgREST path)"""
+        data = dict(record)
+        agent_key = data.pop("agent_key")
+        workload_job_id = data.pop("workload_job_id")
+        source_dc_key = data.pop("source_dc_key")
+        target_dc_key = data.pop("target_dc_key")
 
-        logger.info(f"Logged decision: {decision.get('decision_type')} - {decision.get('decision_id')}")
-        return result.data[0] if result.data else {}
+        # Look up agent UUID
+        agent = self.get_agent_by_id(agent_key) if agent_key else None
+        data["agent_id"] = agent["id"] if agent else None
+
+        # Workload UUID if provided
+        if workload_job_id:
+            wl_result = self.client.table("compute_workloads") \
+                .select("id") \
+                .eq("job_id", workload_job_id) \
+                .execute()
+            data["workload_id"] = wl_result.data[0]["id"] if wl_result.data else None
+
+        # Look up DC UUIDs if provided
+        if source_dc_key:
+            dc = self.get_data_centre_by_dc_id(source_dc_key)
+            data["source_dc_id"] = dc["id"] if dc else None
+        if target_dc_key:
+            dc = self.get_data_centre_by_dc_id(target_dc_key)
+            data["target_dc_id"] = dc["id"] if dc else None
+
+        return {k: v for k, v in data.items() if v is not None}
 
     def get_recent_decisions(self, limit: int = 100) -> list:
         """Get recent orchestration decisions"""
-        result = self.client.table("orchestration_decisions") \
-            .select("*, agents(name), compute_workloads(job_id)") \
-            .order("decided_at", desc=True) \
-            .limit(limit) \
-            .execute()
-
-        return result.data or []
+        return self._rest_get("orchestration_decisions", {
+            "select": "*, agents(name), compute_workloads(job_id)",
+            "order": "decided_at.desc",
+            "limit": str(limit)
+        })
 
     def get_decisions_by_type(self, decision_type: str, limit: int = 100) -> list:
         """Get decisions filtered by type"""
@@ -648,12 +1087,7 @@ class SupabaseClient:
 
     def get_operator_by_name(self, name: str) -> Optional[dict]:
         """Get operator by name"""
-        result = self.client.table("operators") \
-            .select("*") \
-            .eq("name", name) \
-            .execute()
-
-        return result.data[0] if result.data else None
+        return self._rest_get_one(OPERATOR_BY_NAME_PATH, name)
 
     # =========================================================================
     # STORAGE ASSET OPERATIONS
@@ -699,13 +1133,20 @@ class SupabaseClient:
 
     def get_system_state(self) -> dict:
         """Get current system state overview"""
-        try:
-            # Use the view we created
-            result = self.client.rpc("v_system_state").execute()
-            return result.data[0] if result.data else {}
-        except Exception:
-            # Fallback if view RPC doesn't work
-            return {
-                "active_dcs": len(self.get_all_data_centres()),
-                "latest_signal": self.get_latest_grid_signal()
-            }
+        if self._system_state_rpc_available:
+            try:
+                # One round-trip (migration_add_system_state_rpc.sql)
+                result = self.client.rpc("v_system_state").execute()
+                return result.data or {}
+            except Exception as e:
+                if _is_missing_function_error(e):
+                    logger.warning(f"v_system_state RPC unavailable, using separate queries: {e}")
+                    self._system_state_rpc_available = False
+                else:
+                    logger.warning(f"v_system_state RPC failed, using separate queries for this call: {e}")
+
+        # Fallback if the RPC is not installed or failed
+        return {
+            "active_dcs": len(self.get_all_data_centres()),
+            "latest_signal": self.get_latest_grid_signal()
+        }
@@ -1,7 +1,8 @@
 -- =============================================================================
 -- SUPABASE TRIGGERS FOR BECKN GATEWAY
 -- =============================================================================
--- Creates a notification queue that BG.py polls for new workloads
+-- Creates a notification queue that BG.py polls for new workloads, and a
+-- workload_ready NOTIFY so BG.py can wake without waiting for the next poll
 -- =============================================================================
 
 -- 1. Create notification queue table
@@ -51,6 +52,9 @@ BEGIN
         )
     );
 
+    -- Wake BG.py listeners immediately (delivered on commit)
+    PERFORM pg_notify('workload_ready', NEW.job_id);
+
     RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
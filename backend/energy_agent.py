@@ -1,10 +1,23 @@
 import logging
-import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from agent_utils import get_gemini_json_response, log_agent_action, supabase
+from agent_utils import get_gemini_json_response, log_agent_action, supabase, dumps_json
 
 logger = logging.getLogger(__name__)
 
+# One worker per grid data query in _get_latest_grid_data
+GRID_FETCH_POOL = ThreadPoolExecutor(max_workers=9, thread_name_prefix="energy-grid-fetch")
+
+
+def _fetch_table(name: str, query) -> list:
+    """Run one grid data query; a failure only leaves that table empty"""
+    try:
+        return query().data or []
+    except Exception as e:
+        logger.warning(f"Could not fetch {name}: {e}")
+        return []
+
+
 class EnergyAgent:
     """
     Agent responsible for finding the optimal energy window and location for a compute task.
@@ -36,80 +49,34 @@ class EnergyAgent:
         if not supabase:
             return data
         
-        try:
-            # Get carbon intensity national (forecast for next 24-48 hours)
-            try:
-                forecast_end = now + timedelta(hours=48)
-                ci_national = supabase.table("carbon_intensity_national").select("*").gte("timestamp", now.isoformat()).lte("timestamp", forecast_end.isoformat()).order("timestamp", desc=False).limit(96).execute()
-                data["carbon_intensity_national"] = ci_national.data or []
-            except Exception as e:
-                logger.warning(f"Could not fetch carbon intensity national: {e}")
-            
-            # Get carbon intensity regional (latest for each region)
-            try:
-                ci_regional = supabase.table("carbon_intensity_regional").select("*, uk_regions(*)").gte("timestamp", (now - timedelta(hours=2)).isoformat()).order("timestamp", desc=True).limit(50).execute()
-                data["carbon_intensity_regional"] = ci_regional.data or []
-            except Exception as e:
-                logger.warning(f"Could not fetch carbon intensity regional: {e}")
-            
-            # Get demand forecast national (next 24-48 hours)
-            try:
-                forecast_end = now + timedelta(hours=48)
-                demand_forecast = supabase.table("demand_forecast_national").select("*").gte("timestamp", now.isoformat()).lte("timestamp", forecast_end.isoformat()).order("timestamp", desc=False).limit(96).execute()
-                data["demand_forecast_national"] = demand_forecast.data or []
-            except Exception as e:
-                logger.warning(f"Could not fetch demand forecast: {e}")
-            
-            # Get demand actual national (last 24 hours)
-            try:
-                actual_start = now - timedelta(hours=24)
-                demand_actual = supabase.table("demand_actual_national").select("*").gte("timestamp", actual_start.isoformat()).order("timestamp", desc=True).limit(48).execute()
-                data["demand_actual_national"] = demand_actual.data or []
-            except Exception as e:
-                logger.warning(f"Could not fetch demand actual: {e}")
-            
-            # Get generation mix national (latest and forecast)
-            try:
-                gen_mix_start = now - timedelta(hours=2)
-                gen_mix_end = now + timedelta(hours=48)
-                gen_mix = supabase.table("generation_mix_national").select("*").gte("timestamp", gen_mix_start.isoformat()).lte("timestamp", gen_mix_end.isoformat()).order("timestamp", desc=False).limit(100).execute()
-                data["generation_mix_national"] = gen_mix.data or []
-            except Exception as e:
-                logger.warning(f"Could not fetch generation mix national: {e}")
-            
-            # Get generation mix regional (latest for each region)
-            try:
-                gen_mix_regional = supabase.table("generation_mix_regional").select("*, uk_regions(*)").gte("timestamp", (now - timedelta(hours=2)).isoformat()).order("timestamp", desc=True).limit(100).execute()
-                data["generation_mix_regional"] = gen_mix_regional.data or []
-            except Exception as e:
-                logger.warning(f"Could not fetch generation mix regional: {e}")
-            
-            # Get grid snapshots (latest Beckn compute windows)
-            try:
-                snapshots = supabase.table("grid_snapshots").select("*, compute_windows(*, grid_zones(*))").order("snapshot_timestamp", desc=True).limit(50).execute()
-                data["grid_snapshots"] = snapshots.data or []
-            except Exception as e:
-                logger.warning(f"Could not fetch grid snapshots: {e}")
-            
-            # Get UK regions (reference data)
-            try:
-                regions = supabase.table("uk_regions").select("*").execute()
-                data["uk_regions"] = regions.data or []
-            except Exception as e:
-                logger.warning(f"Could not fetch UK regions: {e}")
-            
-            # Get wholesale prices (latest and forecast)
-            try:
-                price_start = now - timedelta(hours=2)
-                price_end = now + timedelta(hours=48)
-                prices = supabase.table("wholesale_prices").select("*").gte("timestamp", price_start.isoformat()).lte("timestamp", price_end.isoformat()).order("timestamp", desc=False).limit(100).execute()
-                data["wholesale_prices"] = prices.data or []
-            except Exception as e:
-                logger.warning(f"Could not fetch wholesale prices: {e}")
-            
-        except Exception as e:
-            logger.error(f"Error fetching grid data: {e}")
-        
+        forecast_end = now + timedelta(hours=48)
+        recent_start = now - timedelta(hours=2)
+        queries = {
+            # Carbon intensity national (forecast for next 24-48 hours)
+            "carbon_intensity_national": lambda: supabase.table("carbon_intensity_national").select("*").gte("timestamp", now.isoformat()).lte("timestamp", forecast_end.isoformat()).order("timestamp", desc=False).limit(96).execute(),
+            # Carbon intensity regional (latest for each region)
+            "carbon_intensity_regional": lambda: supabase.table("carbon_intensity_regional").select("*, uk_regions(*)").gte("timestamp", recent_start.isoformat()).order("timestamp", desc=True).limit(50).execute(),
+            # Demand forecast national (next 24-48 hours)
+            "demand_forecast_national": lambda: supabase.table("demand_forecast_national").select("*").gte("timestamp", now.isoformat()).lte("timestamp", forecast_end.isoformat()).order("timestamp", desc=False).limit(96).execute(),
+            # Demand actual national (last 24 hours)
+            "demand_actual_national": lambda: supabase.table("demand_actual_national").select("*").gte("timestamp", (now - timedelta(hours=24)).isoformat()).order("timestamp", desc=True).limit(48).execute(),
+            # Generation mix national (latest and forecast)
+            "generation_mix_national": lambda: supabase.table("generation_mix_national").select("*").gte("timestamp", recent_start.isoformat()).lte("timestamp", forecast_end.isoformat()).order("timestamp", desc=False).limit(100).execute(),
+            # Generation mix regional (latest for each region)
+            "generation_mix_regional": lambda: supabase.table("generation_mix_regional").select("*, uk_regions(*)").gte("timestamp", recent_start.isoformat()).order("timestamp", desc=True).limit(100).execute(),
+            # Grid snapshots (latest Beckn compute windows)
+            "grid_snapshots": lambda: supabase.table("grid_snapshots").select("*, compute_windows(*, grid_zones(*))").order("snapshot_timestamp", desc=True).limit(50).execute(),
+            # UK regions (reference data)
+            "uk_regions": lambda: supabase.table("uk_regions").select("*").execute(),
+            # Wholesale prices (latest and forecast)
+            "wholesale_prices": lambda: supabase.table("wholesale_prices").select("*").gte("timestamp", recent_start.isoformat()).lte("timestamp", forecast_end.isoformat()).order("timestamp", desc=False).limit(100).execute(),
+        }
+
+        # All queries run concurrently, so the wait is the slowest query, not the sum
+        futures = {name: GRID_FETCH_POOL.submit(_fetch_table, name, query) for name, query in queries.items()}
+        for name, future in futures.items():
+            data[name] = future.result()
+
         return data
 
     def find_optimal_slot(self, compute_requirements: dict) -> dict:
@@ -168,7 +135,7 @@ class EnergyAgent:
         You are an expert AI Energy Agent. Your goal is to analyze comprehensive real-time UK grid data and identify the TOP 3 optimal regions and time windows for a compute task, ranked by energy optimization.
 
         Compute Requirements:
-        {json.dumps(compute_requirements, indent=2)}
+        {dumps_json(compute_requirements, indent=True)}
 
         Available Grid Data:
         - Carbon Intensity (National): {len(grid_data.get('carbon_intensity_national', []))} data points
@@ -182,7 +149,7 @@ class EnergyAgent:
         - Wholesale Prices: {len(grid_data.get('wholesale_prices', []))} price points
 
         Detailed Data:
-        {json.dumps(data_summary, indent=2, default=str)}
+        {dumps_json(data_summary, indent=True)}
 
         Please analyze ALL available data and provide a VALID JSON response with the TOP 3 options:
         {{
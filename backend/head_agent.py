@@ -351,6 +351,7 @@ def get_or_create_pending_asset():
             "metadata": {"description": "Placeholder for unscheduled workloads"}
         }
         response = supabase.table("compute_assets").insert(new_asset).execute()
+        compute_agent.invalidate_compute_resources()
         if response.data:
             return response.data[0]['id']
             
@@ -64,6 +64,7 @@ def get_or_create_pending_asset():
         }
         
         result = supabase.table("compute_assets").insert(new_asset).execute()
+        compute_agent.invalidate_compute_resources()
         if result.data and len(result.data) > 0:
             return result.data[0]['id']
         